@@ -1,18 +1,45 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
+import bisect
+import atexit
+import cProfile
+import csv
+import hmac
+import hashlib
 import html
+import io
 import json
 import mimetypes
+import mmap
 import os
+import pstats
+import queue
+import random
 import re
 import sqlite3
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from itertools import chain, islice
 from pathlib import Path
+from typing import Callable, Iterator, TextIO
 from urllib.parse import parse_qs, unquote, urlparse
 
 
+PROCESS_STARTED = time.perf_counter()
 ROOT = Path(__file__).resolve().parent
 DB_PATH = ROOT / "drugbank_full.db"
+SNAPSHOT_PATH = Path(os.environ.get("NEUROPHARM_SNAPSHOT", DB_PATH.with_suffix(".snapshot")))
 STATIC_DIR = ROOT / "static"
 
 PATIENT_CONTEXT_RULES = {
@@ -78,9 +105,474 @@ RISK_ESCALATORS = {
     "risk": 2,
 }
 
+AUDIT_CHUNK_SIZE = 200
+RISK_PAIR_CHUNK_SIZE = 1000
+RISK_PAIR_LIMIT = 200_000
+SEARCH_LIMIT = 60
+
+# When both directions of a pair are listed, the row under the smaller drug id
+# wins, then the first in that drug's own row order. Rowids alone would not do:
+# refresh.py re-inserts a changed drug's rows at the end of the table.
+PAIR_ORDER = "drug1_id > drug2_id, rowid"
+
+SERVER_MODE = os.environ.get("NEUROPHARM_SERVER", "threading")
+SERVER_WORKERS = int(os.environ.get("NEUROPHARM_WORKERS", "8"))
+KEEPALIVE_SECONDS = 60
+REQUEST_HEAD_LIMIT = 65536
+
+NAME_INDEX: Mapping[str, str] | None = None
+NAME_INDEX_LOCK = threading.Lock()
+
+MECHANISM_GRAPH: MechanismGraph | None = None
+MECHANISM_GRAPH_LOCK = threading.Lock()
+
+SHARED_INDEX: SharedItemIndex | None = None
+SHARED_INDEX_LOCK = threading.Lock()
+
+SNAPSHOT: Snapshot | None = None
+SNAPSHOT_LOADED = False
+SNAPSHOT_LOCK = threading.Lock()
+
+SELECTION_LIMIT = 256
+SELECTIONS: OrderedDict[str, Selection] = OrderedDict()
+SELECTIONS_LOCK = threading.Lock()
+
+DATABASE_STAMP: tuple[int, int] | None = None
+DATABASE_SWAP_LOCK = threading.Lock()
+# Past this many changed drugs a swap rebuilds the in-memory indexes instead
+# of patching them.
+SWAP_PATCH_LIMIT = 2000
+
+OPTIONS_PAYLOAD: dict | None = None
+OPTIONS_LOCK = threading.Lock()
+
+WARMUP_PHASES = ("snapshot", "pages", "options", "names", "mechanism graph", "shared items")
+
+PATIENT_FIELDS = {
+    "description": "Description",
+    "indication": "Indication",
+    "pharmacodynamics": "Pharmacodynamics",
+    "mechanism_of_action": "Mechanism",
+    "toxicity": "Toxicity",
+    "metabolism": "Metabolism",
+    "absorption": "Absorption",
+    "half_life": "Half-life",
+    "route_of_elimination": "Elimination",
+}
+
+SHARED_TABLES = {
+    "categories": ("categories", "category"),
+    "targets": ("targets", "name"),
+    "enzymes": ("enzymes", "name"),
+}
+
+# Indexes behind every keyed lookup below; optimize.py creates them.
+REQUIRED_INDEXES = {
+    "idx_drugs_name": "drugs(name)",
+    "idx_drugs_name_nocase": "drugs(name COLLATE NOCASE)",
+    "idx_synonyms_drug": "synonyms(drug_id, synonym)",
+    "idx_drug_interactions_pair": "drug_interactions(drug1_id, drug2_id)",
+    "idx_drug_interactions_reverse": "drug_interactions(drug2_id, drug1_id)",
+    "idx_food_interactions_drug": "food_interactions(drug_id)",
+    "idx_categories_drug": "categories(drug_id, category)",
+    "idx_categories_category": "categories(category, drug_id)",
+    "idx_targets_drug": "targets(drug_id, name)",
+    "idx_targets_name": "targets(name, drug_id)",
+    "idx_enzymes_drug": "enzymes(drug_id, name)",
+    "idx_enzymes_name": "enzymes(name, drug_id)",
+    "idx_carriers_drug": "carriers(drug_id)",
+    "idx_transporters_drug": "transporters(drug_id)",
+    "idx_products_drug": "products(drug_id)",
+    "idx_dosages_drug": "dosages(drug_id)",
+}
+
+# One query per keyed lookup the API runs. Search matches substrings and
+# scans by design, so it is not listed.
+CANNED_QUERIES = {
+    "selection drugs": "SELECT * FROM drugs WHERE drugbank_id IN (?, ?)",
+    "selection pairs": f"""
+        SELECT drug1_id, drug2_id, description FROM drug_interactions
+        WHERE (drug1_id IN (?) AND drug2_id IN (?, ?)) OR (drug1_id IN (?, ?) AND drug2_id IN (?))
+        ORDER BY {PAIR_ORDER}
+    """,
+    "selection food": "SELECT drug_id, description FROM food_interactions WHERE drug_id IN (?, ?) ORDER BY rowid",
+    **{
+        f"similar {kind}": f"""
+            SELECT d.drugbank_id, d.name, COUNT(DISTINCT src.{column}) AS matches
+            FROM {table} src JOIN drugs d ON d.drugbank_id = src.drug_id
+            WHERE src.{column} IN (?, ?) AND src.drug_id != ?
+            GROUP BY d.drugbank_id, d.name
+        """
+        for kind, (table, column) in SHARED_TABLES.items()
+    },
+    "search synonyms": "SELECT DISTINCT drug_id, synonym FROM synonyms WHERE drug_id IN (?, ?) AND synonym LIKE ? ORDER BY drug_id, synonym",
+    "options": "SELECT drugbank_id, name FROM drugs WHERE name IN (?, ?)",
+    "options alphabetic": "SELECT drugbank_id, name FROM drugs WHERE name IS NOT NULL ORDER BY name COLLATE NOCASE LIMIT 102",
+    "check pair": f"SELECT * FROM drug_interactions WHERE (drug1_id = ? AND drug2_id = ?) OR (drug1_id = ? AND drug2_id = ?) ORDER BY {PAIR_ORDER} LIMIT 1",
+    "detail categories": "SELECT category FROM categories WHERE drug_id = ? ORDER BY category LIMIT 10",
+    "detail targets": "SELECT name, organism, action FROM targets WHERE drug_id = ? LIMIT 8",
+    "detail enzymes": "SELECT name, organism FROM enzymes WHERE drug_id = ? LIMIT 8",
+    "detail carriers": "SELECT name FROM carriers WHERE drug_id = ? LIMIT 8",
+    "detail transporters": "SELECT name FROM transporters WHERE drug_id = ? LIMIT 8",
+    "detail products": "SELECT name, manufacturer, dosage_form, route FROM products WHERE drug_id = ? LIMIT 8",
+    "detail dosages": "SELECT form, route, strength FROM dosages WHERE drug_id = ? LIMIT 8",
+    "interaction count": "SELECT COUNT(*) FROM drug_interactions WHERE drug1_id = ? OR drug2_id = ?",
+    "drug interactions": """
+        SELECT drug2_id AS other_id, description FROM drug_interactions WHERE drug1_id = ?
+        UNION
+        SELECT drug1_id AS other_id, description FROM drug_interactions WHERE drug2_id = ?
+    """,
+}
+
+MECHANISM_KINDS = {
+    "enzymes": "enzyme",
+    "transporters": "transporter",
+    "carriers": "carrier",
+    "targets": "target",
+}
+PATHWAY_KINDS = ("enzymes", "transporters")
+OPPOSING_ACTIONS = {
+    "agonist": {"antagonist", "inhibitor", "blocker", "inverse agonist", "negative modulator"},
+    "activator": {"inhibitor", "blocker", "antagonist"},
+    "positive allosteric modulator": {"antagonist", "negative modulator", "blocker"},
+}
+
+SEVERITY_LABELS = {"high": "High attention", "moderate": "Monitor", "informational": "Informational"}
+SEVERITIES = tuple(SEVERITY_LABELS)
+
+# Compiled snapshot layout: a header, a section table, then 8-byte aligned
+# little-endian arrays. Bump SNAPSHOT_VERSION whenever a section changes.
+SNAPSHOT_MAGIC = b"NPSNAP\0\0"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<8sIIQQ")
+SNAPSHOT_SECTION = struct.Struct("<8sQQ")
+SNAPSHOT_NULL = 0xFFFFFFFF
+PROFILE_FIELDS = ("description", "indication", "mechanism", "toxicity", "metabolism", "half_life")
+SNAPSHOT_DRUG_COLUMNS = ("drugbank_id", "name", *(f"profile.{field}" for field in PROFILE_FIELDS), *PATIENT_FIELDS)
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUANTILES = (0.5, 0.95, 0.99)
+
+API_ROUTES = frozenset(
+    {
+        "/",
+        "/api/metrics",
+        "/api/health",
+        "/api/stats",
+        "/api/search",
+        "/api/options",
+        "/api/check",
+        "/api/check-many",
+        "/api/ai-insights",
+        "/api/patient-risk",
+        "/api/audit/stream",
+        "/api/audit/batch",
+        "/api/patient-risk/batch",
+        "/api/audits",
+        "/api/similar",
+        "/api/drugs",
+    }
+)
+ROUTE_PATTERNS = (
+    (re.compile(r"^/api/drugs/[^/]+/interactions$"), "/api/drugs/<id>/interactions"),
+    (re.compile(r"^/api/drugs/[^/]+$"), "/api/drugs/<id>"),
+    (re.compile(r"^/api/profiles/[^/]+$"), "/api/profiles/<id>"),
+    (re.compile(r"^/api/audits/[^/]+$"), "/api/audits/<id>"),
+    (re.compile(r"^/static/"), "/static"),
+)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """In-process request, SQL and encoding metrics in Prometheus text format."""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.latency: dict[str, Histogram] = {}
+        self.sizes: dict[str, Histogram] = {}
+        self.statuses: dict[tuple[str, str, int], int] = {}
+        self.queries: dict[str, list[float]] = {}
+        self.timers: dict[str, list[float]] = {}
+
+    def request_started(self) -> None:
+        with self.lock:
+            self.in_flight += 1
+
+    def request_finished(self, route: str, method: str, status: int, seconds: float, size: int) -> None:
+        with self.lock:
+            self.in_flight -= 1
+            self.latency.setdefault(route, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.sizes.setdefault(route, Histogram(SIZE_BUCKETS)).observe(size)
+            key = (route, method, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def observe_query(self, statement: str, seconds: float, rows: int) -> None:
+        with self.lock:
+            entry = self.queries.setdefault(statement, [0, 0.0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += rows
+            entry[3] = max(entry[3], seconds)
+
+    def observe_time(self, name: str, seconds: float) -> None:
+        with self.lock:
+            entry = self.timers.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            lines += [
+                "# HELP neuropharm_requests_in_flight Requests currently being handled.",
+                "# TYPE neuropharm_requests_in_flight gauge",
+                f"neuropharm_requests_in_flight {self.in_flight}",
+                "# HELP neuropharm_requests_total Completed requests by route, method and status.",
+                "# TYPE neuropharm_requests_total counter",
+            ]
+            for (route, method, status), count in sorted(self.statuses.items()):
+                lines.append(f'neuropharm_requests_total{{route="{label(route)}",method="{method}",status="{status}"}} {count}')
+            lines += self.render_histograms("neuropharm_request_duration_seconds", "Request latency by route.", self.latency)
+            lines += [
+                "# HELP neuropharm_request_duration_quantile_seconds Latency quantiles estimated from the histogram buckets.",
+                "# TYPE neuropharm_request_duration_quantile_seconds gauge",
+            ]
+            for route, histogram in sorted(self.latency.items()):
+                for q in QUANTILES:
+                    lines.append(f'neuropharm_request_duration_quantile_seconds{{route="{label(route)}",quantile="{q}"}} {histogram.quantile(q):.6f}')
+            lines += self.render_histograms("neuropharm_response_size_bytes", "Response body size by route.", self.sizes)
+            lines += [
+                "# HELP neuropharm_sql_seconds SQLite execute and fetch time by statement.",
+                "# TYPE neuropharm_sql_seconds summary",
+            ]
+            for statement, (count, total, _, _) in sorted(self.queries.items()):
+                lines.append(f'neuropharm_sql_seconds_count{{statement="{label(statement)}"}} {count}')
+                lines.append(f'neuropharm_sql_seconds_sum{{statement="{label(statement)}"}} {total:.6f}')
+            lines += ["# HELP neuropharm_sql_max_seconds Slowest execution by statement.", "# TYPE neuropharm_sql_max_seconds gauge"]
+            for statement, (_, _, _, slowest) in sorted(self.queries.items()):
+                lines.append(f'neuropharm_sql_max_seconds{{statement="{label(statement)}"}} {slowest:.6f}')
+            lines += ["# HELP neuropharm_sql_rows_total Rows fetched by statement.", "# TYPE neuropharm_sql_rows_total counter"]
+            for statement, (_, _, rows, _) in sorted(self.queries.items()):
+                lines.append(f'neuropharm_sql_rows_total{{statement="{label(statement)}"}} {rows}')
+            lines += [
+                "# HELP neuropharm_step_seconds Time spent in clean_text and JSON encoding.",
+                "# TYPE neuropharm_step_seconds summary",
+            ]
+            for name, (count, total) in sorted(self.timers.items()):
+                lines.append(f'neuropharm_step_seconds_count{{step="{name}"}} {count}')
+                lines.append(f'neuropharm_step_seconds_sum{{step="{name}"}} {total:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def render_histograms(self, name: str, help_text: str, histograms: dict[str, Histogram]) -> list[str]:
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for route, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{route="{label(route)}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{route="{label(route)}"}} {histogram.total:.6f}')
+            lines.append(f'{name}_count{{route="{label(route)}"}} {histogram.count}')
+        return lines
+
+
+METRICS = Metrics(enabled=os.environ.get("NEUROPHARM_METRICS", "1") != "0")
+
+ADMIN_TOKEN = os.environ.get("NEUROPHARM_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("NEUROPHARM_PROFILE_SAMPLE", "0"))
+PROFILE_DIR = Path(os.environ.get("NEUROPHARM_PROFILE_DIR", ROOT / "profiles"))
+PROFILE_KEEP = int(os.environ.get("NEUROPHARM_PROFILE_KEEP", "200"))
+# One profiler per process: from Python 3.12 cProfile claims sys.monitoring,
+# and even before that a second one would time the first one's work too.
+PROFILE_SLOTS = threading.BoundedSemaphore(1)
+PROFILE_PRUNE_LOCK = threading.Lock()
+
+SLOW_QUERY_SECONDS = float(os.environ.get("NEUROPHARM_SLOW_QUERY_MS", "0")) / 1000
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get("NEUROPHARM_SLOW_QUERY_SAMPLE", "1"))
+SLOW_QUERY_LOG = os.environ.get("NEUROPHARM_SLOW_QUERY_LOG", "")
+SLOW_QUERY_LOCK = threading.Lock()
+
+HISTORY_PATH = os.environ.get("NEUROPHARM_HISTORY", str(ROOT / "audit_history.db"))
+HISTORY_RETENTION_DAYS = float(os.environ.get("NEUROPHARM_HISTORY_DAYS", "90"))
+HISTORY_MAX_CASES = int(os.environ.get("NEUROPHARM_HISTORY_MAX_CASES", "20000"))
+HISTORY_QUEUE_LIMIT = 10000
+HISTORY_BATCH_SIZE = 200
+HISTORY_PRUNE_EVERY = 1000
+
+
+def label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def route_label(path: str) -> str:
+    if path in API_ROUTES:
+        return path
+    for pattern, name in ROUTE_PATTERNS:
+        if pattern.match(path):
+            return name
+    return "other"
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql: str) -> str:
+    # Placeholder lists and repeated VALUES tuples vary with the batch size;
+    # both collapse so one statement is one metrics series.
+    statement = " ".join(sql.split())
+    statement = re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", statement)
+    return re.sub(r"(\([^()]*\))(?:\s*,\s*\1)+", r"\1, ...", statement)
+
+
+def log_slow_query(db: sqlite3.Connection, sql: str, parameters: object, seconds: float, rows: int) -> None:
+    if random.random() >= SLOW_QUERY_SAMPLE_RATE:
+        return
+    values = list(parameters.values()) if isinstance(parameters, dict) else list(parameters or ())
+    try:
+        plan = [row[-1] for row in sqlite3.Connection.execute(db, f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()]
+    except sqlite3.Error as exc:
+        plan = [f"unavailable: {exc}"]
+    entry = json.dumps(
+        {
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ms": round(seconds * 1000, 2),
+            "rows": rows,
+            "statement": statement_label(sql),
+            "parameters": dict(Counter(type(value).__name__ for value in values)),
+            "plan": plan,
+        }
+    )
+    with SLOW_QUERY_LOCK:
+        if SLOW_QUERY_LOG:
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as handle:
+                handle.write(entry + "\n")
+        else:
+            print(f"slow query {entry}")
+
+
+def prune_profiles() -> None:
+    """Keep only the newest PROFILE_KEEP stats files."""
+    with PROFILE_PRUNE_LOCK:
+        profiles = []
+        for path in PROFILE_DIR.glob("*.pstats"):
+            try:
+                profiles.append((path.stat().st_mtime, path))
+            except OSError:
+                pass
+        profiles.sort(reverse=True)
+        for _, path in profiles[PROFILE_KEEP:]:
+            path.unlink(missing_ok=True)
+
+
+class MeteredCursor(sqlite3.Cursor):
+    """Cursor that records each statement once its rows are read, whether
+    they are fetched or iterated."""
+
+    sql = ""
+    parameters: object = ()
+    elapsed = 0.0
+    rows = 0
+    pending = False
+
+    def execute(self, sql: str, parameters: object = ()) -> MeteredCursor:
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self.elapsed = time.perf_counter() - started
+        self.rows = 0
+        self.pending = True
+        self.sql = sql
+        self.parameters = parameters
+        return self
+
+    def fetchall(self) -> list:
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.elapsed += time.perf_counter() - started
+        self.rows += len(rows)
+        self.finish()
+        return rows
+
+    def fetchone(self) -> object:
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.elapsed += time.perf_counter() - started
+        self.rows += row is not None
+        self.finish()
+        return row
+
+    def fetchmany(self, size: int | None = None) -> list:
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.elapsed += time.perf_counter() - started
+        self.rows += len(rows)
+        if len(rows) < (self.arraysize if size is None else size):
+            self.finish()
+        return rows
+
+    def __next__(self) -> object:
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.elapsed += time.perf_counter() - started
+            self.finish()
+            raise
+        self.elapsed += time.perf_counter() - started
+        self.rows += 1
+        return row
+
+    def close(self) -> None:
+        self.finish()
+        super().close()
+
+    def finish(self) -> None:
+        if not self.pending:
+            return
+        self.pending = False
+        if METRICS.enabled:
+            METRICS.observe_query(statement_label(self.sql), self.elapsed, self.rows)
+        if SLOW_QUERY_SECONDS and self.elapsed >= SLOW_QUERY_SECONDS:
+            log_slow_query(self.connection, self.sql, self.parameters, self.elapsed, self.rows)
+
+
+class MeteredConnection(sqlite3.Connection):
+    def execute(self, sql: str, parameters: object = ()) -> sqlite3.Cursor:
+        if not METRICS.enabled and not SLOW_QUERY_SECONDS:
+            return super().execute(sql, parameters)
+        return self.cursor(MeteredCursor).execute(sql, parameters)
+
 
 def get_db() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=MeteredConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -89,6 +581,7 @@ def clean_text(text: str | None) -> str:
     if not text:
         return ""
 
+    started = time.perf_counter()
     cleaned = html.unescape(str(text))
     cleaned = re.sub(r"<\s*br\s*/?\s*>", " ", cleaned, flags=re.IGNORECASE)
     cleaned = re.sub(r"<\s*(sub|sup)\s*>(.*?)<\s*/\s*\1\s*>", r"\2", cleaned, flags=re.IGNORECASE | re.DOTALL)
@@ -108,6 +601,8 @@ def clean_text(text: str | None) -> str:
     cleaned = re.sub(r"\[([^\[\]]+)\]", clean_reference, cleaned)
     cleaned = re.sub(r"\s+([,.;:])", r"\1", cleaned)
     cleaned = re.sub(r"\s{2,}", " ", cleaned)
+    if METRICS.enabled:
+        METRICS.observe_time("clean_text", time.perf_counter() - started)
     return cleaned.strip()
 
 
@@ -124,10 +619,351 @@ def severity_for(description: str | None) -> tuple[str, str]:
     moderate_terms = ("risk", "severity", "increase", "decrease", "adverse", "serum concentration")
 
     if any(term in text for term in high_terms):
-        return "high", "High attention"
+        return "high", SEVERITY_LABELS["high"]
     if any(term in text for term in moderate_terms):
-        return "moderate", "Monitor"
-    return "informational", "Informational"
+        return "moderate", SEVERITY_LABELS["moderate"]
+    return "informational", SEVERITY_LABELS["informational"]
+
+
+def field_points(rule: dict, lower: str) -> int:
+    return min(rule["points"] + sum(points for term, points in RISK_ESCALATORS.items() if term in lower), 24)
+
+
+def food_points(rule: dict) -> int:
+    return min(rule["points"] + 3, 18)
+
+
+def pair_points(rule: dict, severity: str) -> int:
+    return min(rule["points"] + (12 if severity == "high" else 6 if severity == "moderate" else 3), 28)
+
+
+def interaction_record(row: sqlite3.Row) -> dict:
+    level, label = severity_for(row["description"])
+    return {
+        "drug1_id": row["drug1_id"],
+        "drug2_id": row["drug2_id"],
+        "description": clean_text(row["description"]),
+        "severity": level,
+        "label": label,
+    }
+
+
+def action_roles(action: str | None) -> frozenset[str]:
+    return frozenset(role.strip().lower() for role in re.split(r"[,;|/]", action or "") if role.strip())
+
+
+def pathway_effect(kind: str, item: str, first: tuple[str, frozenset[str]], second: tuple[str, frozenset[str]]) -> tuple[str, str] | None:
+    (name1, roles1), (name2, roles2) = first, second
+    if kind in PATHWAY_KINDS:
+        for (perpetrator, roles_p), (victim, roles_v) in ((first, second), (second, first)):
+            if "substrate" not in roles_v:
+                continue
+            if "inhibitor" in roles_p:
+                return "moderate", f"{perpetrator} inhibits {item}, which clears {victim}; {victim} exposure may rise"
+            if "inducer" in roles_p:
+                return "moderate", f"{perpetrator} induces {item}, which clears {victim}; {victim} exposure may fall"
+        if "substrate" in roles1 and "substrate" in roles2:
+            return "informational", f"{name1} and {name2} are both {item} substrates and may compete for it"
+        return None
+    if kind == "carriers":
+        return "informational", f"{name1} and {name2} both bind {item}; protein-binding displacement is possible"
+
+    for role, opposites in OPPOSING_ACTIONS.items():
+        if (role in roles1 and roles2 & opposites) or (role in roles2 and roles1 & opposites):
+            return "moderate", f"{name1} and {name2} act in opposite directions on {item}"
+    shared = sorted(roles1 & roles2)
+    if shared:
+        return "informational", f"{name1} and {name2} are both {shared[0]}s of {item}; effects may add up"
+    return None
+
+
+class MechanismGraph:
+    """Bipartite index of drugs and the enzymes, transporters, carriers and
+    targets they act on, with the action roles DrugBank lists for each link."""
+
+    def __init__(self) -> None:
+        self.items: list[tuple[str, str]] = []
+        self.item_ids: dict[tuple[str, str], int] = {}
+        self.links: dict[str, dict[int, frozenset[str]]] = {}
+
+    def without(self, drug_ids: set[str]) -> MechanismGraph:
+        """A copy without the links of `drug_ids`, to load them again from a
+        refreshed file. Requests holding this graph keep reading it unchanged."""
+        graph = MechanismGraph()
+        graph.items = list(self.items)
+        graph.item_ids = dict(self.item_ids)
+        graph.links = {drug_id: links for drug_id, links in self.links.items() if drug_id not in drug_ids}
+        return graph
+
+    def add(self, drug_id: str, kind: str, name: str, roles: frozenset[str]) -> None:
+        key = (kind, name)
+        item = self.item_ids.get(key)
+        if item is None:
+            item = self.item_ids[key] = len(self.items)
+            self.items.append(key)
+        links = self.links.setdefault(drug_id, {})
+        links[item] = links.get(item, frozenset()) | roles
+
+    def pathways(self, first: tuple[str, str], second: tuple[str, str]) -> list[dict]:
+        (drug1_id, name1), (drug2_id, name2) = first, second
+        links1, links2 = self.links.get(drug1_id, {}), self.links.get(drug2_id, {})
+        findings = []
+        # Ordered by kind and name rather than item id, so a graph loaded for
+        # a few drugs lists them exactly as the full graph does.
+        kinds = {kind: rank for rank, kind in enumerate(MECHANISM_KINDS)}
+        shared = sorted(links1.keys() & links2.keys(), key=lambda item: (kinds[self.items[item][0]], self.items[item][1]))
+        for item in shared:
+            kind, name = self.items[item]
+            effect = pathway_effect(kind, name, (name1, links1[item]), (name2, links2[item]))
+            if effect is not None:
+                findings.append(
+                    {
+                        "kind": MECHANISM_KINDS[kind],
+                        "name": name,
+                        "roles": [sorted(links1[item]), sorted(links2[item])],
+                        "severity": effect[0],
+                        "effect": effect[1],
+                    }
+                )
+        findings.sort(key=lambda finding: finding["severity"] != "moderate")
+        return findings
+
+
+def drug_scope(drug_ids: list[str] | None) -> tuple[str, list[str]]:
+    if drug_ids is None:
+        return "", []
+    return f" AND drug_id IN ({','.join('?' for _ in drug_ids)})", list(drug_ids)
+
+
+def load_mechanism_graph(db: sqlite3.Connection, drug_ids: list[str] | None = None, graph: MechanismGraph | None = None) -> MechanismGraph:
+    graph = graph if graph is not None else MechanismGraph()
+    names: dict[str, str] = {}
+    scope, parameters = drug_scope(drug_ids)
+    for kind in MECHANISM_KINDS:
+        columns = {row[1] for row in db.execute(f"PRAGMA table_info({kind})")}
+        action = "action" if "action" in columns else "NULL"
+        for row in db.execute(
+            f"SELECT drug_id, name, {action} AS action FROM {kind} WHERE name IS NOT NULL{scope} ORDER BY rowid", parameters
+        ):
+            raw = row["name"]
+            if raw not in names:
+                names[raw] = clean_text(raw)
+            if names[raw]:
+                graph.add(row["drug_id"], kind, names[raw], action_roles(row["action"]))
+    return graph
+
+
+class SharedItemIndex:
+    """Inverted index from cleaned category, target and enzyme names to the
+    drugs listing them.
+
+    Drugs and items are interned to integers and each item's drugs are one int
+    bitmap, so the drugs of a selection sharing an item are a single AND.
+    """
+
+    def __init__(self) -> None:
+        self.drug_bits: dict[str, int] = {}
+        self.names: dict[str, list[str]] = {kind: [] for kind in SHARED_TABLES}
+        self.item_ids: dict[str, dict[str, int]] = {kind: {} for kind in SHARED_TABLES}
+        self.postings: dict[str, list[int]] = {kind: [] for kind in SHARED_TABLES}
+        self.drug_items: dict[str, dict[str, tuple[int, ...]]] = {kind: {} for kind in SHARED_TABLES}
+
+    def build(self, kind: str, rows: Iterator[tuple[str, str]]) -> None:
+        item_ids, names, postings = self.item_ids[kind], self.names[kind], self.postings[kind]
+        members: dict[int, list[int]] = {}
+        drug_items: dict[str, dict[int, None]] = {}
+        for drug_id, name in rows:
+            item = item_ids.get(name)
+            if item is None:
+                item = item_ids[name] = len(names)
+                names.append(name)
+                postings.append(0)
+            bit = self.drug_bits.setdefault(drug_id, len(self.drug_bits))
+            members.setdefault(item, []).append(bit)
+            drug_items.setdefault(drug_id, {})[item] = None
+
+        for item, bits in members.items():
+            bitmap = bytearray(max(bits) // 8 + 1)
+            for bit in bits:
+                bitmap[bit >> 3] |= 1 << (bit & 7)
+            postings[item] |= int.from_bytes(bitmap, "little")
+        # Items keep the order each drug first lists them in, which breaks
+        # ranking ties the same way for every selection.
+        self.drug_items[kind].update((drug_id, tuple(items)) for drug_id, items in drug_items.items())
+
+    def without(self, drug_ids: set[str]) -> SharedItemIndex:
+        """A copy with `drug_ids` cleared from every posting, to load them
+        again from a refreshed file. They keep their bits."""
+        index = SharedItemIndex()
+        index.drug_bits = dict(self.drug_bits)
+        for kind in SHARED_TABLES:
+            index.names[kind] = list(self.names[kind])
+            index.item_ids[kind] = dict(self.item_ids[kind])
+            postings = index.postings[kind] = list(self.postings[kind])
+            drug_items = self.drug_items[kind]
+            for drug_id in drug_ids & drug_items.keys():
+                mask = ~(1 << self.drug_bits[drug_id])
+                for item in drug_items[drug_id]:
+                    postings[item] &= mask
+            index.drug_items[kind] = {drug_id: items for drug_id, items in drug_items.items() if drug_id not in drug_ids}
+        return index
+
+    def shared(self, ids: list[str], limit: int = 8) -> tuple[dict[str, list[tuple[str, list[int]]]], list[list[int]]]:
+        """Items listed by two or more of `ids`, ranked by coverage, with the
+        positions in `ids` of the drugs sharing each; and the pairwise count
+        of items each two drugs share."""
+        members = [(self.drug_bits[drug_id], index) for index, drug_id in enumerate(ids) if drug_id in self.drug_bits]
+        mask = 0
+        for bit, _ in members:
+            mask |= 1 << bit
+        counts = [[0] * len(ids) for _ in ids]
+        ranked = {}
+        for kind, postings in self.postings.items():
+            drug_items = self.drug_items[kind]
+            candidates = dict.fromkeys(item for drug_id in ids for item in drug_items.get(drug_id, ()))
+            found = []
+            for item in candidates:
+                hits = postings[item] & mask
+                if hits & (hits - 1):
+                    sharing = [index for bit, index in members if hits >> bit & 1]
+                    for position, first in enumerate(sharing):
+                        for second in sharing[position + 1 :]:
+                            counts[first][second] += 1
+                            counts[second][first] += 1
+                    found.append((self.names[kind][item], sharing))
+            found.sort(key=lambda entry: (-len(entry[1]), entry[0].lower()))
+            ranked[kind] = found[:limit]
+        return ranked, counts
+
+
+def load_shared_index(db: sqlite3.Connection, drug_ids: list[str] | None = None, index: SharedItemIndex | None = None) -> SharedItemIndex:
+    index = index if index is not None else SharedItemIndex()
+    scope, parameters = drug_scope(drug_ids)
+    for kind, (table, column) in SHARED_TABLES.items():
+        names: dict[str, str] = {}
+
+        def rows() -> Iterator[tuple[str, str]]:
+            for drug_id, raw in db.execute(
+                f"SELECT drug_id, {column} FROM {table} WHERE {column} IS NOT NULL{scope} ORDER BY rowid", parameters
+            ):
+                if raw not in names:
+                    names[raw] = clean_text(raw)
+                if names[raw]:
+                    yield drug_id, names[raw]
+
+        index.build(kind, rows())
+    return index
+
+
+def load_name_index(db: sqlite3.Connection) -> dict[str, str]:
+    index: dict[str, str] = {}
+    for row in db.execute("SELECT synonym, drug_id FROM synonyms WHERE synonym IS NOT NULL"):
+        index[row["synonym"].strip().casefold()] = row["drug_id"]
+    for row in db.execute("SELECT name, drugbank_id FROM drugs WHERE name IS NOT NULL"):
+        index[row["name"].strip().casefold()] = row["drugbank_id"]
+    for row in db.execute("SELECT drugbank_id FROM drugs"):
+        index.setdefault(row["drugbank_id"].casefold(), row["drugbank_id"])
+    return index
+
+
+def full_scans(db: sqlite3.Connection) -> dict[str, list[str]]:
+    # Canned queries read base tables only, so a SCAN step without an index is
+    # a full table scan; an index-ordered SCAN stops at the query's LIMIT.
+    scans: dict[str, list[str]] = {}
+    for name, sql in CANNED_QUERIES.items():
+        for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * sql.count("?")):
+            if row[3].startswith("SCAN ") and " USING " not in row[3] and row[3] != "SCAN CONSTANT ROW":
+                scans.setdefault(name, []).append(row[3])
+    return scans
+
+
+def missing_indexes(db: sqlite3.Connection) -> list[str]:
+    existing = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    return [name for name in REQUIRED_INDEXES if name not in existing]
+
+
+def warm_pages(db: sqlite3.Connection) -> list[str]:
+    """Read every page of the required indexes and the columns search scans,
+    so the first requests after a restart find them in the OS page cache."""
+    existing = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    read = []
+    for name, definition in REQUIRED_INDEXES.items():
+        if name in existing:
+            db.execute(f"SELECT COUNT(*) FROM {definition.split('(')[0]} INDEXED BY {name}").fetchone()
+            read.append(name)
+    db.execute("SELECT MAX(LENGTH(name)) FROM drugs").fetchone()
+    db.execute("SELECT MAX(LENGTH(synonym)) FROM synonyms").fetchone()
+    return [*read, "drugs", "synonyms"]
+
+
+def split_list(raw: str | None) -> list[str]:
+    return [item.strip() for item in re.split(r"[;|\n]", raw or "") if item.strip()]
+
+
+def prescription_rows(handle: TextIO, default_contexts: str) -> Iterator[dict]:
+    for row in csv.DictReader(handle):
+        contexts = ",".join(split_list((row.get("contexts") or "").replace(",", ";")))
+        yield {
+            "patient_id": (row.get("patient_id") or "").strip(),
+            "medications": row.get("medications") or "",
+            "contexts": contexts or default_contexts,
+        }
+
+
+class LimitedReader(io.RawIOBase):
+    def __init__(self, stream: io.BufferedIOBase, length: int) -> None:
+        self.stream = stream
+        self.remaining = length
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining <= 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        if self.remaining <= 0:
+            return 0
+        data = self.stream.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class ChunkedReader(io.RawIOBase):
+    def __init__(self, stream: io.BufferedIOBase) -> None:
+        self.stream = stream
+        self.remaining = 0
+        self.finished = False
+
+    @property
+    def exhausted(self) -> bool:
+        return self.finished
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        if self.finished:
+            return 0
+        if self.remaining == 0:
+            size_line = self.stream.readline(1024).split(b";", 1)[0].strip()
+            self.remaining = int(size_line or b"0", 16)
+            if self.remaining == 0:
+                while self.stream.readline(1024).strip():
+                    pass
+                self.finished = True
+                return 0
+        data = self.stream.read(min(len(buffer), self.remaining))
+        if not data:
+            self.finished = True
+            return 0
+        self.remaining -= len(data)
+        if self.remaining == 0:
+            self.stream.readline(1024)
+        buffer[: len(data)] = data
+        return len(data)
 
 
 def row_to_drug(row: sqlite3.Row | None) -> dict | None:
@@ -145,103 +981,860 @@ def row_to_drug(row: sqlite3.Row | None) -> dict | None:
     }
 
 
-class NeuroPharmHandler(BaseHTTPRequestHandler):
-    server_version = "NeuroPharmDB/1.0"
+class SnapshotError(Exception):
+    pass
+
+
+def database_stamp(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
 
-    def do_GET(self) -> None:
-        parsed = urlparse(self.path)
-        path = unquote(parsed.path)
 
+class SnapshotNames(Mapping):
+    """Casefolded drug name, synonym and id lookup backed by sorted snapshot arrays."""
+
+    def __init__(self, snapshot: Snapshot) -> None:
+        self.snapshot = snapshot
+        self.keys = snapshot.section("NAMEKEYS", "I")
+        self.values = snapshot.section("NAMEVALS", "I")
+
+    def __getitem__(self, name: str) -> str:
+        key = name.encode("utf-8")
+        index = bisect.bisect_left(range(len(self.keys)), key, key=lambda i: self.snapshot.raw_string(self.keys[i]))
+        if index == len(self.keys) or self.snapshot.raw_string(self.keys[index]) != key:
+            raise KeyError(name)
+        return self.snapshot.string(self.values[index])
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.snapshot.string(key) for key in self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class Snapshot:
+    """Read-only view of a compiled snapshot (see snapshot.py).
+
+    Every section is a memoryview over one shared mmap, so opening costs a
+    header parse and processes reading the same file share its pages.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        if sys.byteorder != "little":
+            raise SnapshotError("compiled snapshots are little-endian only")
+        with open(path, "rb") as handle:
+            self.map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
         try:
-            if path == "/":
-                self.send_index()
-            elif path.startswith("/static/"):
-                self.send_static(path.removeprefix("/static/"))
-            elif path == "/api/stats":
-                self.send_json(self.stats())
-            elif path == "/api/search":
-                params = parse_qs(parsed.query)
-                self.send_json(self.search(params.get("q", [""])[0]))
-            elif path == "/api/options":
-                params = parse_qs(parsed.query)
-                self.send_json(self.options(params.get("q", [""])[0]))
-            elif path == "/api/check":
-                params = parse_qs(parsed.query)
-                self.send_json(
-                    self.check_pair(
-                        params.get("drug1", [""])[0],
-                        params.get("drug2", [""])[0],
-                    )
+            self.parse()
+        except (struct.error, TypeError) as error:
+            raise SnapshotError(f"{path} is malformed: {error}") from None
+
+    def parse(self) -> None:
+        path = self.path
+        if len(self.map) < SNAPSHOT_HEADER.size:
+            raise SnapshotError(f"{path} is truncated")
+        magic, version, section_count, source_size, source_mtime_ns = SNAPSHOT_HEADER.unpack_from(self.map)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{path} is not a NeuroPharmDB snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(f"{path} has format version {version}, expected {SNAPSHOT_VERSION}; recompile it")
+        self.source_stamp = (source_size, source_mtime_ns)
+        if SNAPSHOT_HEADER.size + section_count * SNAPSHOT_SECTION.size > len(self.map):
+            raise SnapshotError(f"{path} is truncated")
+
+        self.view = memoryview(self.map)
+        self.sections: dict[str, memoryview] = {}
+        for index in range(section_count):
+            name, offset, length = SNAPSHOT_SECTION.unpack_from(self.map, SNAPSHOT_HEADER.size + index * SNAPSHOT_SECTION.size)
+            if offset % 8 or offset + length > len(self.map):
+                raise SnapshotError(f"{path} is truncated or has a misaligned section")
+            self.sections[name.rstrip(b"\0").decode("ascii")] = self.view[offset : offset + length]
+
+        self.meta = json.loads(bytes(self.section("META")))
+        if self.meta.get("drugColumns") != list(SNAPSHOT_DRUG_COLUMNS):
+            raise SnapshotError(f"{path} was compiled with different drug columns; recompile it")
+        self.string_data = self.section("STRDATA")
+        self.string_offsets = self.section("STROFFS", "Q")
+        self.drugs = self.section("DRUGS", "I")
+        self.drug_count = len(self.drugs) // len(SNAPSHOT_DRUG_COLUMNS)
+        self.adjacency_offsets = self.section("ADJOFFS", "Q")
+        self.adjacency_drugs = self.section("ADJDRUG", "I")
+        self.adjacency_interactions = self.section("ADJIXN", "I")
+        self.interactions = self.section("IXNS", "I")
+        self.food_offsets = self.section("FOODOFFS", "Q")
+        self.food_texts = self.section("FOOD", "I")
+        self.names = SnapshotNames(self)
+
+    def section(self, name: str, fmt: str = "B") -> memoryview:
+        if name not in self.sections:
+            raise SnapshotError(f"{self.path} has no {name} section")
+        return self.sections[name].cast(fmt)
+
+    def close(self) -> None:
+        for view in (self.names.keys, self.names.values, *vars(self).values()):
+            if isinstance(view, memoryview):
+                view.release()
+        for view in self.sections.values():
+            view.release()
+        self.view.release()
+        self.map.close()
+
+    def raw_string(self, string_id: int) -> bytes:
+        return self.string_data[self.string_offsets[string_id] : self.string_offsets[string_id + 1]].tobytes()
+
+    def string(self, string_id: int) -> str | None:
+        if string_id == SNAPSHOT_NULL:
+            return None
+        return self.raw_string(string_id).decode("utf-8")
+
+    def column(self, drug_index: int, column: int) -> str | None:
+        return self.string(self.drugs[drug_index * len(SNAPSHOT_DRUG_COLUMNS) + column])
+
+    def drug_index(self, drug_id: str) -> int | None:
+        key = drug_id.encode("utf-8")
+        columns = len(SNAPSHOT_DRUG_COLUMNS)
+        index = bisect.bisect_left(range(self.drug_count), key, key=lambda i: self.raw_string(self.drugs[i * columns]))
+        if index == self.drug_count or self.raw_string(self.drugs[index * columns]) != key:
+            return None
+        return index
+
+    def drug(self, drug_index: int) -> dict:
+        return {"drugbank_id": self.column(drug_index, 0), "name": self.column(drug_index, 1)}
+
+    def profile(self, drug_index: int) -> dict:
+        drug_id = self.column(drug_index, 0)
+        profile = {"id": drug_id, "name": self.column(drug_index, 1) or drug_id}
+        for column, field in enumerate(PROFILE_FIELDS, start=2):
+            profile[field] = self.column(drug_index, column)
+        return profile
+
+    def texts(self, drug_index: int) -> dict[str, str]:
+        start = 2 + len(PROFILE_FIELDS)
+        return {field: self.column(drug_index, column) for column, field in enumerate(PATIENT_FIELDS, start=start)}
+
+    def food(self, drug_index: int) -> list[str]:
+        start, end = self.food_offsets[drug_index], self.food_offsets[drug_index + 1]
+        return [self.string(string_id) for string_id in self.food_texts[start:end]]
+
+    def interaction(self, drug1_index: int, drug2_index: int) -> dict | None:
+        start, end = self.adjacency_offsets[drug1_index], self.adjacency_offsets[drug1_index + 1]
+        position = bisect.bisect_left(self.adjacency_drugs, drug2_index, start, end)
+        if position == end or self.adjacency_drugs[position] != drug2_index:
+            return None
+        record = self.adjacency_interactions[position] * 4
+        first, second, text, severity = self.interactions[record : record + 4]
+        level = SEVERITIES[severity]
+        return {
+            "drug1_id": self.column(first, 0),
+            "drug2_id": self.column(second, 0),
+            "description": self.string(text),
+            "severity": level,
+            "label": SEVERITY_LABELS[level],
+        }
+
+
+def load_snapshot(path: Path, db_path: Path) -> Snapshot | None:
+    if not path.exists():
+        return None
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, ValueError, SnapshotError) as error:
+        print(f"Ignoring snapshot: {error}", file=sys.stderr)
+        return None
+    if db_path.exists() and snapshot.source_stamp != database_stamp(db_path):
+        print(f"Ignoring snapshot {path}: {db_path} changed since it was compiled; run snapshot.py again", file=sys.stderr)
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def refresh_manifest_path(db_path: Path) -> Path:
+    return db_path.with_suffix(".refresh.json")
+
+
+def reload_if_swapped() -> None:
+    """Bring caches built from the previous file up to date once refresh.py
+    swaps DB_PATH.
+
+    With a manifest for the new file, only the changed drugs are touched: their
+    links and postings are reloaded into copies of the mechanism graph and
+    shared-item index, and the selections holding them are dropped. The name
+    index and options go only when names changed. The snapshot mapping is always
+    reopened. Without a manifest, or past SWAP_PATCH_LIMIT changed drugs,
+    everything is rebuilt. Requests already running keep the connection,
+    snapshot mapping and indexes they started with.
+    """
+    global DATABASE_STAMP, MECHANISM_GRAPH, NAME_INDEX, OPTIONS_PAYLOAD, SHARED_INDEX, SNAPSHOT, SNAPSHOT_LOADED
+    try:
+        stamp = database_stamp(DB_PATH)
+    except OSError:
+        return
+    if stamp == DATABASE_STAMP:
+        return
+    with DATABASE_SWAP_LOCK:
+        if stamp == DATABASE_STAMP:
+            return
+        previous, DATABASE_STAMP = DATABASE_STAMP, stamp
+        if previous is None:
+            return
+
+        manifest = None
+        try:
+            manifest = json.loads(refresh_manifest_path(DB_PATH).read_text())
+        except (OSError, ValueError):
+            pass
+        if manifest is None or tuple(manifest.get("stamp", ())) != stamp:
+            manifest = None
+        changed = set(manifest["changedDrugs"]) if manifest else None
+        patch = changed is not None and len(changed) <= SWAP_PATCH_LIMIT
+
+        with SNAPSHOT_LOCK:
+            had_snapshot = SNAPSHOT is not None
+            SNAPSHOT, SNAPSHOT_LOADED = None, False
+        patched, dropped = [], []
+        with MECHANISM_GRAPH_LOCK:
+            if patch and MECHANISM_GRAPH is not None:
+                with get_db() as db:
+                    MECHANISM_GRAPH = load_mechanism_graph(db, sorted(changed), MECHANISM_GRAPH.without(changed))
+                patched.append("the mechanism graph")
+            elif MECHANISM_GRAPH is not None:
+                MECHANISM_GRAPH = None
+                dropped.append("the mechanism graph")
+        with SHARED_INDEX_LOCK:
+            if patch and SHARED_INDEX is not None:
+                with get_db() as db:
+                    SHARED_INDEX = load_shared_index(db, sorted(changed), SHARED_INDEX.without(changed))
+                patched.append("the shared-item index")
+            elif SHARED_INDEX is not None:
+                SHARED_INDEX = None
+                dropped.append("the shared-item index")
+        names_changed = changed is None or manifest["namesChanged"]
+        if names_changed:
+            with OPTIONS_LOCK:
+                OPTIONS_PAYLOAD = None
+        reset_names = names_changed or had_snapshot
+        if reset_names:
+            with NAME_INDEX_LOCK:
+                NAME_INDEX = None
+        with SELECTIONS_LOCK:
+            stale = [token for token, selection in SELECTIONS.items() if changed is None or not changed.isdisjoint(selection.drugs)]
+            for token in stale:
+                del SELECTIONS[token]
+
+    scope = f"{len(changed):,} changed drugs" if changed is not None else "no matching refresh manifest"
+    dropped.insert(0, f"{len(stale)} cached selections")
+    if names_changed:
+        dropped.append("the option list")
+    if reset_names:
+        dropped.append("the name index")
+    if had_snapshot:
+        dropped.append("the snapshot mapping")
+    print(
+        f"Switched to refreshed {DB_PATH.name} ({scope}); "
+        + (f"reloaded {', '.join(patched)} for those drugs; " if patched else "")
+        + f"dropped {', '.join(dropped)}",
+        file=sys.stderr,
+    )
+    WARMUP.restart()
+
+
+class AuditHistory:
+    """Saved audits in a separate WAL-mode SQLite file.
+
+    Results are content-addressed by the resolved drugs and contexts in input
+    order (pair order, alternatives and context scores follow it) and the
+    database stamp, so re-opening an unchanged case is one primary-key lookup.
+    Cases record each time an audit was run or re-opened. Writes go through a
+    queue drained in batches by one background thread, off the request path.
+    """
+
+    def __init__(self, path: Path, retention_days: float, max_cases: int) -> None:
+        self.path = path
+        self.retention_days = retention_days
+        self.max_cases = max_cases
+        self.queue: queue.Queue[tuple[dict, dict | None]] = queue.Queue(HISTORY_QUEUE_LIMIT)
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+        self.dropped = 0
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is not None:
+                return
+            with self.connect() as db:
+                db.execute("PRAGMA journal_mode = WAL")
+                db.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS results (
+                        key TEXT PRIMARY KEY,
+                        db_stamp TEXT NOT NULL,
+                        drug_ids TEXT NOT NULL,
+                        contexts TEXT NOT NULL,
+                        stages BLOB NOT NULL,
+                        created_at REAL NOT NULL,
+                        opened_at REAL NOT NULL,
+                        opens INTEGER NOT NULL DEFAULT 0
+                    );
+                    CREATE TABLE IF NOT EXISTS cases (
+                        id TEXT PRIMARY KEY,
+                        result_key TEXT NOT NULL,
+                        patient TEXT NOT NULL,
+                        inputs TEXT NOT NULL,
+                        drug_names TEXT NOT NULL,
+                        contexts TEXT NOT NULL,
+                        cached INTEGER NOT NULL,
+                        created_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_cases_created ON cases(created_at);
+                    CREATE INDEX IF NOT EXISTS idx_cases_result ON cases(result_key);
+                    """
                 )
-            elif path == "/api/check-many":
-                params = parse_qs(parsed.query)
-                self.send_json(self.check_many(params.get("ids", [""])[0]))
-            elif path == "/api/ai-insights":
-                params = parse_qs(parsed.query)
-                self.send_json(self.ai_insights(params.get("ids", [""])[0]))
-            elif path == "/api/patient-risk":
-                params = parse_qs(parsed.query)
-                self.send_json(
-                    self.patient_risk(
-                        params.get("ids", [""])[0],
-                        params.get("contexts", [""])[0],
+            self.prune()
+            self.thread = threading.Thread(target=self.write_behind, name="audit-history", daemon=True)
+            self.thread.start()
+            atexit.register(self.queue.join)
+
+    def key(self, drug_ids: list[str], contexts: list[str], stamp: str) -> str:
+        content = json.dumps({"drugIds": drug_ids, "contexts": contexts, "db": stamp})
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def result(self, key: str) -> dict | None:
+        self.start()
+        with self.connect() as db:
+            row = db.execute("SELECT stages, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return {"stages": json.loads(zlib.decompress(row["stages"])), "savedAt": row["created_at"]}
+
+    def save(self, case: dict, stages: dict | None) -> None:
+        self.start()
+        try:
+            self.queue.put_nowait((case, stages))
+        except queue.Full:
+            self.dropped += 1
+
+    def write_behind(self) -> None:
+        writes = 0
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < HISTORY_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+                writes += len(batch)
+                if writes >= HISTORY_PRUNE_EVERY:
+                    self.prune()
+                    writes = 0
+            except Exception as exc:
+                print(f"Audit history write failed: {exc}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def write(self, batch: list[tuple[dict, dict | None]]) -> None:
+        with self.connect() as db:
+            for case, stages in batch:
+                if stages is not None:
+                    db.execute(
+                        """
+                        INSERT OR IGNORE INTO results (key, db_stamp, drug_ids, contexts, stages, created_at, opened_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (
+                            case["resultKey"],
+                            case["dbStamp"],
+                            json.dumps(case["drugIds"]),
+                            json.dumps(case["contexts"]),
+                            zlib.compress(json.dumps(stages, ensure_ascii=False).encode("utf-8")),
+                            case["createdAt"],
+                            case["createdAt"],
+                        ),
                     )
+                else:
+                    db.execute(
+                        "UPDATE results SET opens = opens + 1, opened_at = ? WHERE key = ?",
+                        (case["createdAt"], case["resultKey"]),
+                    )
+                db.execute(
+                    "INSERT OR REPLACE INTO cases VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        case["id"],
+                        case["resultKey"],
+                        case["patient"],
+                        json.dumps(case["inputs"], ensure_ascii=False),
+                        ", ".join(case["drugNames"]),
+                        json.dumps(case["contexts"]),
+                        int(stages is None),
+                        case["createdAt"],
+                    ),
                 )
-            elif path == "/api/similar":
-                params = parse_qs(parsed.query)
-                self.send_json(self.similar_drugs(params.get("drug", [""])[0]))
-            elif path.startswith("/api/drugs/") and path.endswith("/interactions"):
-                drug_id = path.removeprefix("/api/drugs/").removesuffix("/interactions").strip("/")
-                params = parse_qs(parsed.query)
-                self.send_json(self.drug_interactions(drug_id, params.get("q", [""])[0]))
-            elif path.startswith("/api/drugs/"):
-                drug_id = path.removeprefix("/api/drugs/").strip("/")
-                self.send_json(self.drug_detail(drug_id))
-            else:
-                self.send_error(404, "Not found")
-        except Exception as exc:
-            self.send_json({"error": str(exc)}, status=500)
 
-    def log_message(self, fmt: str, *args: object) -> None:
-        print(f"{self.address_string()} - {fmt % args}")
+    def prune(self) -> None:
+        cutoff = time.time() - self.retention_days * 86400
+        with self.connect() as db:
+            db.execute("DELETE FROM cases WHERE created_at < ?", (cutoff,))
+            db.execute(
+                "DELETE FROM cases WHERE id NOT IN (SELECT id FROM cases ORDER BY created_at DESC LIMIT ?)",
+                (self.max_cases,),
+            )
+            db.execute("DELETE FROM results WHERE key NOT IN (SELECT result_key FROM cases)")
+
+    def cases(self, query: str, limit: int = 50) -> dict:
+        self.start()
+        q = " ".join(query.strip().split())
+        contains = f"%{q}%"
+        with self.connect() as db:
+            rows = db.execute(
+                """
+                SELECT id, patient, inputs, drug_names, contexts, cached, created_at
+                FROM cases
+                WHERE ? = '' OR patient LIKE ? OR drug_names LIKE ? OR inputs LIKE ?
+                ORDER BY created_at DESC
+                LIMIT ?
+                """,
+                (q, contains, contains, contains, max(1, min(limit, 200))),
+            ).fetchall()
+        return {"results": [self.case_view(row) for row in rows]}
 
-    def send_index(self) -> None:
-        html_doc = (STATIC_DIR / "index.html").read_bytes()
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.send_header("Content-Length", str(len(html_doc)))
-        self.end_headers()
-        self.wfile.write(html_doc)
+    def case(self, case_id: str) -> dict:
+        self.start()
+        with self.connect() as db:
+            row = db.execute(
+                """
+                SELECT cases.*, results.stages, results.db_stamp
+                FROM cases JOIN results ON results.key = cases.result_key
+                WHERE cases.id = ?
+                """,
+                (case_id,),
+            ).fetchone()
+        if row is None:
+            return {"error": "Saved audit not found."}
+        return {
+            **self.case_view(row),
+            "dbStamp": row["db_stamp"],
+            "current": row["db_stamp"] == database_version(),
+            "stages": json.loads(zlib.decompress(row["stages"])),
+        }
 
-    def send_static(self, filename: str) -> None:
-        safe_path = (STATIC_DIR / filename).resolve()
-        if not str(safe_path).startswith(str(STATIC_DIR.resolve())) or not safe_path.is_file():
-            self.send_error(404, "Static file not found")
+    def case_view(self, row: sqlite3.Row) -> dict:
+        return {
+            "id": row["id"],
+            "patient": row["patient"],
+            "inputs": json.loads(row["inputs"]),
+            "drugs": row["drug_names"].split(", ") if row["drug_names"] else [],
+            "contexts": json.loads(row["contexts"]),
+            "reopened": bool(row["cached"]),
+            "createdAt": row["created_at"],
+        }
+
+
+def database_version() -> str:
+    size, mtime_ns = database_stamp(DB_PATH)
+    return f"{size}-{mtime_ns}"
+
+
+AUDIT_HISTORY = AuditHistory(Path(HISTORY_PATH), HISTORY_RETENTION_DAYS, HISTORY_MAX_CASES) if HISTORY_PATH else None
+
+
+class Warmup:
+    """Cold-start work done on a background thread once the socket is bound.
+
+    Phases run in WARMUP_PHASES order. Until a phase is done, the endpoints
+    that depend on it take their plain SQL path instead of waiting for it.
+    Scripts that never call start() keep building everything lazily.
+    """
+
+    def __init__(self, started: float) -> None:
+        self.started = started
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+        self.rerun = False
+        self.phases: dict[str, dict] = {}
+        self.first_response: float | None = None
+        self.warm: float | None = None
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                self.rerun = True
+                return
+            self.reset()
+            self.thread = threading.Thread(target=self.run, name="neuropharm-warmup", daemon=True)
+            self.thread.start()
+
+    def restart(self) -> None:
+        if self.thread is not None:
+            self.start()
+
+    def reset(self) -> None:
+        self.phases = {name: {"name": name, "status": "pending", "seconds": None} for name in WARMUP_PHASES}
+        self.warm = None
+
+    def pending(self, name: str) -> bool:
+        phase = self.phases.get(name)
+        return phase is not None and phase["status"] in ("pending", "running")
+
+    def run(self) -> None:
+        api = NeuroPharmAPI()
+
+        def snapshot() -> None:
+            loaded = api.snapshot()
+            if loaded is not None:
+                print(f"Serving hot paths from compiled snapshot {loaded.path}")
+            else:
+                print(f"No current snapshot at {SNAPSHOT_PATH}; reading SQLite directly (python3 snapshot.py compiles one)")
+
+        steps = {
+            "snapshot": snapshot,
+            "pages": api.warm_pages,
+            "options": partial(api.options, ""),
+            "names": api.name_index,
+            "mechanism graph": api.mechanism_graph,
+            "shared items": api.shared_index,
+        }
+        while True:
+            started = time.perf_counter()
+            for name, phase in self.phases.items():
+                phase["status"] = "running"
+                phase_started = time.perf_counter()
+                try:
+                    steps[name]()
+                except (OSError, ValueError, sqlite3.Error, SnapshotError) as error:
+                    phase["status"], phase["error"] = "failed", str(error)
+                    print(f"Warm-up phase {name} failed: {error}", file=sys.stderr)
+                else:
+                    phase["status"] = "done"
+                phase["seconds"] = round(time.perf_counter() - phase_started, 3)
+            with self.lock:
+                if self.rerun:
+                    self.rerun = False
+                    self.reset()
+                    continue
+                self.warm = time.perf_counter() - self.started
+            timings = ", ".join(f"{name} {phase['seconds']:.2f}s" for name, phase in self.phases.items())
+            print(
+                f"Fully warm {self.warm:.2f}s after start; warm-up took {time.perf_counter() - started:.2f}s ({timings})",
+                file=sys.stderr,
+            )
             return
 
-        content = safe_path.read_bytes()
-        mime_type = mimetypes.guess_type(safe_path.name)[0] or "application/octet-stream"
-        self.send_response(200)
-        self.send_header("Content-Type", mime_type)
-        self.send_header("Cache-Control", "no-store")
-        self.send_header("Content-Length", str(len(content)))
-        self.end_headers()
-        self.wfile.write(content)
+    def responded(self) -> None:
+        if self.first_response is not None or self.thread is None:
+            return
+        with self.lock:
+            if self.first_response is None:
+                self.first_response = time.perf_counter() - self.started
+                print(f"First response {self.first_response:.3f}s after start", file=sys.stderr)
+
+    def status(self) -> dict:
+        phases = [dict(phase) for phase in self.phases.values()]
+        finished = sum(phase["status"] in ("done", "failed") for phase in phases)
+        ready = finished == len(phases)
+        return {
+            "status": "ready" if ready else "warming",
+            "ready": ready,
+            "progress": round(finished / len(phases), 3) if phases else 1.0,
+            "phases": phases,
+            "uptimeSeconds": round(time.perf_counter() - self.started, 3),
+            "firstResponseSeconds": None if self.first_response is None else round(self.first_response, 3),
+            "warmSeconds": None if self.warm is None else round(self.warm, 3),
+            "version": database_version(),
+        }
 
-    def send_json(self, payload: dict | list, status: int = 200) -> None:
-        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+
+WARMUP = Warmup(PROCESS_STARTED)
+
+
+class Selection:
+    """Per-drug and per-pair pieces of a drug selection.
+
+    The full endpoints fill a fresh Selection; a token-keyed session keeps one
+    between requests so only drugs and pairs it has not seen are computed.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.drugs: dict[str, Mapping] = {}
+        self.profiles: dict[str, dict] = {}
+        self.texts: dict[str, dict[str, str]] = {}
+        self.interactions: dict[frozenset[str], dict | None] = {}
+        self.paired: set[str] = set()
+        self.food: dict[str, list[str]] = {}
+        self.field_signals: dict[tuple[str, str], list[dict]] = {}
+        self.food_signals: dict[tuple[str, str], list[dict]] = {}
+        self.pair_signals: dict[tuple[frozenset[str], str], dict | None] = {}
+
+    def retain(self, ids: list[str]) -> None:
+        keep = set(ids)
+        for cache in (self.drugs, self.profiles, self.texts, self.food):
+            for drug_id in [drug_id for drug_id in cache if drug_id not in keep]:
+                del cache[drug_id]
+        for pair in [pair for pair in self.interactions if not pair <= keep]:
+            del self.interactions[pair]
+        self.paired &= keep
+        for cache in (self.field_signals, self.food_signals):
+            for key in [key for key in cache if key[0] not in keep]:
+                del cache[key]
+        for key in [key for key in self.pair_signals if not key[0] <= keep]:
+            del self.pair_signals[key]
+
+
+class RiskScorer:
+    """Patient-context scores for many regimens at once.
+
+    A drug's field and food signals reduce to one vector of points and signal
+    counts per context, and an interacting pair's to another, so a regimen's
+    scores are the sum of its drugs' and pairs' vectors. Each vector is built
+    once per scorer and the numbers match patient_risk exactly.
+    """
+
+    def __init__(self, api: NeuroPharmAPI) -> None:
+        self.api = api
+        self.contexts = list(PATIENT_CONTEXT_RULES)
+        self.positions = {context: position for position, context in enumerate(self.contexts)}
+        self.drug_vectors: dict[str, tuple[int, ...] | None] = {}
+        self.pair_vectors: dict[frozenset[str], tuple[int, ...] | None] = {}
+        self.pair_severities: dict[frozenset[str], str | None] = {}
+
+    def vector(self, texts: list[str], food: list[str]) -> tuple[int, ...]:
+        fields = [text.lower() for text in texts if text]
+        foods = [text.lower() for text in food]
+        points = [0] * len(self.contexts)
+        counts = [0] * len(self.contexts)
+        for position, context in enumerate(self.contexts):
+            rule = PATIENT_CONTEXT_RULES[context]
+            terms = rule["terms"]
+            for lower in fields:
+                if any(term in lower for term in terms):
+                    points[position] += field_points(rule, lower)
+                    counts[position] += 1
+            for lower in foods:
+                if any(term in lower for term in terms):
+                    points[position] += food_points(rule)
+                    counts[position] += 1
+        return (*points, *counts)
+
+    def pair_vector(self, record: dict | None) -> tuple[int, ...] | None:
+        if record is None:
+            return None
+        text = record["description"]
+        lower = text.lower()
+        severity, _ = severity_for(text)
+        points = [0] * len(self.contexts)
+        counts = [0] * len(self.contexts)
+        for position, context in enumerate(self.contexts):
+            rule = PATIENT_CONTEXT_RULES[context]
+            if any(term in lower for term in rule["terms"]):
+                points[position] = pair_points(rule, severity)
+                counts[position] = 1
+        return (*points, *counts) if any(counts) else None
+
+    def prepare(self, regimens: list[list[str]]) -> None:
+        """Build the vectors `regimens` need that this scorer has not seen."""
+        drug_ids = [drug_id for drug_id in dict.fromkeys(drug_id for ids in regimens for drug_id in ids) if drug_id not in self.drug_vectors]
+        snapshot = self.api.snapshot()
+        if snapshot is not None:
+            for drug_id in drug_ids:
+                index = snapshot.drug_index(drug_id)
+                self.drug_vectors[drug_id] = None if index is None else self.vector(list(snapshot.texts(index).values()), snapshot.food(index))
+        elif drug_ids:
+            self.load_drugs(drug_ids)
+
+        pairs = {
+            frozenset((drug1_id, drug2_id))
+            for ids in regimens
+            for index, drug1_id in enumerate(ids)
+            for drug2_id in ids[index + 1 :]
+            if drug1_id != drug2_id and self.drug_vectors.get(drug1_id) is not None and self.drug_vectors.get(drug2_id) is not None
+        }
+        if len(self.pair_vectors) + len(pairs) > RISK_PAIR_LIMIT:
+            self.pair_vectors.clear()
+            self.pair_severities.clear()
+        else:
+            pairs.difference_update(self.pair_vectors)
+        if snapshot is not None:
+            for pair in pairs:
+                drug1_id, drug2_id = pair
+                record = snapshot.interaction(snapshot.drug_index(drug1_id), snapshot.drug_index(drug2_id))
+                self.pair_vectors[pair] = self.pair_vector(record)
+                self.pair_severities[pair] = record["severity"] if record is not None else None
+        elif pairs:
+            self.load_pairs(list(pairs))
+
+    def load_drugs(self, drug_ids: list[str]) -> None:
+        with self.api.connect() as db:
+            for start in range(0, len(drug_ids), RISK_PAIR_CHUNK_SIZE):
+                chunk = drug_ids[start : start + RISK_PAIR_CHUNK_SIZE]
+                placeholders = ",".join("?" for _ in chunk)
+                rows = {row["drugbank_id"]: row for row in db.execute(f"SELECT * FROM drugs WHERE drugbank_id IN ({placeholders})", chunk).fetchall()}
+                food: dict[str, list[str]] = {drug_id: [] for drug_id in chunk}
+                for row in db.execute(
+                    f"SELECT drug_id, description FROM food_interactions WHERE drug_id IN ({placeholders}) ORDER BY rowid", chunk
+                ).fetchall():
+                    food[row["drug_id"]].append(clean_text(row["description"]))
+                for drug_id in chunk:
+                    row = rows.get(drug_id)
+                    self.drug_vectors[drug_id] = None if row is None else self.vector([clean_text(row[field]) for field in PATIENT_FIELDS], food[drug_id])
+
+    def load_pairs(self, pairs: list[frozenset[str]]) -> None:
+        # Both directions are probed through the pair indexes; the row that
+        # sorts first by PAIR_ORDER wins, as in load_selection.
+        with self.api.connect() as db:
+            for start in range(0, len(pairs), RISK_PAIR_CHUNK_SIZE):
+                chunk = pairs[start : start + RISK_PAIR_CHUNK_SIZE]
+                parameters: list[str] = []
+                for pair in chunk:
+                    first, second = pair
+                    parameters.extend((first, second, second, first))
+                found: dict[frozenset[str], tuple[tuple[bool, int], sqlite3.Row]] = {}
+                for row in db.execute(
+                    f"""
+                    WITH wanted(first, second) AS (VALUES {",".join("(?, ?)" for _ in range(len(chunk) * 2))})
+                    SELECT interaction.rowid AS row_number, drug1_id, drug2_id, description
+                    FROM wanted
+                    JOIN drug_interactions AS interaction
+                      ON interaction.drug1_id = wanted.first AND interaction.drug2_id = wanted.second
+                    """,
+                    parameters,
+                ).fetchall():
+                    pair = frozenset((row["drug1_id"], row["drug2_id"]))
+                    rank = (row["drug1_id"] > row["drug2_id"], row["row_number"])
+                    if pair not in found or rank < found[pair][0]:
+                        found[pair] = (rank, row)
+                for pair in chunk:
+                    match = found.get(pair)
+                    record = interaction_record(match[1]) if match is not None else None
+                    self.pair_vectors[pair] = self.pair_vector(record)
+                    self.pair_severities[pair] = record["severity"] if record is not None else None
+
+    def interactions(self, ids: list[str]) -> tuple[list[str], list[tuple[str, str, str | None]]]:
+        """The drugs of `ids` not in the database; or, when all are, each
+        pair's interaction severity (None if none is listed) in check_many's
+        order, with no drug profiles built."""
+        if any(drug_id not in self.drug_vectors for drug_id in ids):
+            self.prepare([ids])
+        missing = [drug_id for drug_id in ids if self.drug_vectors[drug_id] is None]
+        if missing:
+            return missing, []
+        pairs = [(drug1_id, drug2_id) for index, drug1_id in enumerate(ids) for drug2_id in ids[index + 1 :]]
+        if any(frozenset(pair) not in self.pair_severities for pair in pairs):
+            self.prepare([ids])
+        return [], [(drug1_id, drug2_id, self.pair_severities[frozenset((drug1_id, drug2_id))]) for drug1_id, drug2_id in pairs]
+
+    def score(self, ids: list[str], contexts: list[str]) -> dict:
+        """The scores of patient_risk for `ids`, without the evidence."""
+        if any(drug_id not in self.drug_vectors for drug_id in ids):
+            self.prepare([ids])
+        vectors = [self.drug_vectors[drug_id] for drug_id in ids]
+        if None in vectors:
+            return {"error": "One or more selected drugs could not be found."}
+        pairs = [frozenset((drug1_id, drug2_id)) for index, drug1_id in enumerate(ids) for drug2_id in ids[index + 1 :]]
+        if any(pair not in self.pair_vectors for pair in pairs):
+            self.prepare([ids])
+        vectors.extend(vector for vector in map(self.pair_vectors.__getitem__, pairs) if vector is not None)
+        totals = [sum(column) for column in zip(*vectors)]
+
+        offset = len(self.contexts)
+        context_results = []
+        signal_count = 0
+        for context in contexts:
+            position = self.positions[context]
+            score = min(100, totals[position])
+            context_results.append(
+                {
+                    "id": context,
+                    "label": PATIENT_CONTEXT_RULES[context]["label"],
+                    "score": score,
+                    "level": self.api.risk_level(score),
+                    "signalCount": totals[offset + position],
+                }
+            )
+            signal_count += totals[offset + position]
+        context_results.sort(key=lambda item: (-item["score"], item["label"]))
+        overall_score = min(100, sum(item["score"] for item in context_results) // max(1, len(context_results)) + min(20, signal_count * 2))
+        return {
+            "overall": {
+                "score": overall_score,
+                "level": self.api.risk_level(overall_score),
+                "label": self.api.risk_level(overall_score).replace("_", " ").title(),
+            },
+            "contexts": context_results,
+        }
+
+
+class NeuroPharmAPI:
+    def connect(self) -> sqlite3.Connection:
+        return get_db()
+
+    def snapshot(self) -> Snapshot | None:
+        global SNAPSHOT, SNAPSHOT_LOADED
+        with SNAPSHOT_LOCK:
+            if not SNAPSHOT_LOADED:
+                SNAPSHOT = load_snapshot(SNAPSHOT_PATH, DB_PATH)
+                SNAPSHOT_LOADED = True
+        return SNAPSHOT
+
+    def name_index(self) -> Mapping[str, str]:
+        global NAME_INDEX
+        with NAME_INDEX_LOCK:
+            if NAME_INDEX is None:
+                snapshot = self.snapshot()
+                if snapshot is not None:
+                    NAME_INDEX = snapshot.names
+                else:
+                    with self.connect() as db:
+                        NAME_INDEX = load_name_index(db)
+        return NAME_INDEX
+
+    def mechanism_graph(self, ids: list[str] | None = None) -> MechanismGraph:
+        """The full graph; while warm-up is still building it, a graph of just
+        `ids` read from SQLite, so the request does not wait for it."""
+        global MECHANISM_GRAPH
+        if MECHANISM_GRAPH is None and ids is not None and WARMUP.pending("mechanism graph"):
+            with self.connect() as db:
+                return load_mechanism_graph(db, ids)
+        with MECHANISM_GRAPH_LOCK:
+            if MECHANISM_GRAPH is None:
+                with self.connect() as db:
+                    MECHANISM_GRAPH = load_mechanism_graph(db)
+        return MECHANISM_GRAPH
+
+    def shared_index(self, ids: list[str] | None = None) -> SharedItemIndex:
+        global SHARED_INDEX
+        if SHARED_INDEX is None and ids is not None and WARMUP.pending("shared items"):
+            with self.connect() as db:
+                return load_shared_index(db, ids)
+        with SHARED_INDEX_LOCK:
+            if SHARED_INDEX is None:
+                with self.connect() as db:
+                    SHARED_INDEX = load_shared_index(db)
+        return SHARED_INDEX
+
+    def warm_pages(self) -> None:
+        snapshot = self.snapshot()
+        if snapshot is not None and hasattr(mmap, "MADV_WILLNEED"):
+            snapshot.map.madvise(mmap.MADV_WILLNEED)
+        with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as db:
+            warm_pages(db)
+
+    def health(self) -> dict:
+        return WARMUP.status()
 
     def stats(self) -> dict:
-        with get_db() as db:
+        with self.connect() as db:
             drugs = db.execute("SELECT COUNT(*) FROM drugs").fetchone()[0]
             interactions = db.execute("SELECT COUNT(*) FROM drug_interactions").fetchone()[0]
             food = db.execute("SELECT COUNT(*) FROM food_interactions").fetchone()[0]
-        return {"drugs": drugs, "interactions": interactions, "foodInteractions": food}
+        return {"drugs": drugs, "interactions": interactions, "foodInteractions": food, "version": database_version()}
 
     def search(self, query: str) -> dict:
         q = " ".join(query.strip().split())
@@ -250,7 +1843,7 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
 
         prefix = f"{q}%"
         contains = f"%{q}%"
-        with get_db() as db:
+        with self.connect() as db:
             rows = db.execute(
                 """
                 WITH matched AS (
@@ -271,26 +1864,48 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
                 FROM matched
                 GROUP BY drugbank_id, name
                 ORDER BY rank, LENGTH(name), name
-                LIMIT 60
+                LIMIT ?
                 """,
-                (prefix, contains, contains),
+                (prefix, contains, contains, SEARCH_LIMIT),
             ).fetchall()
 
-        return {
-            "results": [
-                {
-                    "id": row["drugbank_id"],
-                    "name": row["name"] or row["drugbank_id"],
-                    "synonym": row["matched_synonym"],
-                }
-                for row in rows
-            ]
-        }
+            # A short list holds every match, so the browser can answer longer
+            # queries by filtering it; that needs each drug's matching synonyms.
+            complete = len(rows) < SEARCH_LIMIT
+            synonyms: dict[str, list[str]] = {}
+            if complete and rows:
+                ids = [row["drugbank_id"] for row in rows]
+                for row in db.execute(
+                    """
+                    SELECT DISTINCT drug_id, synonym
+                    FROM synonyms
+                    WHERE drug_id IN ({}) AND synonym LIKE ?
+                    ORDER BY drug_id, synonym
+                    """.format(",".join("?" for _ in ids)),
+                    [*ids, contains],
+                ):
+                    synonyms.setdefault(row["drug_id"], []).append(row["synonym"])
+
+        results = []
+        for row in rows:
+            result = {
+                "id": row["drugbank_id"],
+                "name": row["name"] or row["drugbank_id"],
+                "synonym": row["matched_synonym"],
+            }
+            if complete:
+                result["synonyms"] = synonyms.get(row["drugbank_id"], [])
+            results.append(result)
+        return {"results": results, "complete": complete}
 
     def options(self, query: str) -> dict:
+        global OPTIONS_PAYLOAD
         q = " ".join(query.strip().split())
         if q:
             return self.search(q)
+        payload = OPTIONS_PAYLOAD
+        if payload is not None:
+            return payload
 
         preferred = [
             "Acetylsalicylic acid",
@@ -313,7 +1928,7 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             "Levothyroxine",
         ]
 
-        with get_db() as db:
+        with self.connect() as db:
             preferred_rows = db.execute(
                 """
                 SELECT drugbank_id, name, NULL AS matched_synonym
@@ -339,7 +1954,7 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             ).fetchall()
             rows.extend(alphabetic_rows)
 
-        return {
+        payload = {
             "results": [
                 {
                     "id": row["drugbank_id"],
@@ -349,8 +1964,135 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
                 for row in rows
             ]
         }
+        with OPTIONS_LOCK:
+            OPTIONS_PAYLOAD = payload
+        return payload
+
+    def selection(self, token: str = "") -> Selection:
+        if not token:
+            return Selection()
+        with SELECTIONS_LOCK:
+            selection = SELECTIONS.pop(token, None) or Selection()
+            SELECTIONS[token] = selection
+            while len(SELECTIONS) > SELECTION_LIMIT:
+                SELECTIONS.popitem(last=False)
+        return selection
+
+    def load_selection(
+        self,
+        selection: Selection,
+        ids: list[str],
+        *,
+        interactions: bool = False,
+        food: bool = False,
+    ) -> list[str]:
+        selection.retain(ids)
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return self.load_compiled_selection(snapshot, selection, ids, interactions=interactions, food=food)
+
+        new_ids = [drug_id for drug_id in ids if drug_id not in selection.drugs]
+        with self.connect() as db:
+            if new_ids:
+                placeholders = ",".join("?" for _ in new_ids)
+                for row in db.execute(f"SELECT * FROM drugs WHERE drugbank_id IN ({placeholders})", new_ids).fetchall():
+                    selection.drugs[row["drugbank_id"]] = row
+            missing = [drug_id for drug_id in ids if drug_id not in selection.drugs]
+            if missing:
+                return missing
+
+            if interactions:
+                new_side = [drug_id for drug_id in ids if drug_id not in selection.paired]
+                if new_side:
+                    new_placeholders = ",".join("?" for _ in new_side)
+                    all_placeholders = ",".join("?" for _ in ids)
+                    rows = db.execute(
+                        f"""
+                        SELECT drug1_id, drug2_id, description
+                        FROM drug_interactions
+                        WHERE (drug1_id IN ({new_placeholders}) AND drug2_id IN ({all_placeholders}))
+                           OR (drug1_id IN ({all_placeholders}) AND drug2_id IN ({new_placeholders}))
+                        ORDER BY {PAIR_ORDER}
+                        """,
+                        [*new_side, *ids, *ids, *new_side],
+                    ).fetchall()
+                    found: dict[frozenset[str], sqlite3.Row] = {}
+                    for row in rows:
+                        found.setdefault(frozenset((row["drug1_id"], row["drug2_id"])), row)
+                    for drug1_id in new_side:
+                        for drug2_id in ids:
+                            if drug1_id != drug2_id:
+                                pair = frozenset((drug1_id, drug2_id))
+                                row = found.get(pair)
+                                selection.interactions[pair] = interaction_record(row) if row is not None else None
+                    selection.paired.update(new_side)
+
+            if food:
+                pending_food = [drug_id for drug_id in ids if drug_id not in selection.food]
+                if pending_food:
+                    placeholders = ",".join("?" for _ in pending_food)
+                    rows = db.execute(
+                        f"""
+                        SELECT drug_id, description
+                        FROM food_interactions
+                        WHERE drug_id IN ({placeholders})
+                        ORDER BY rowid
+                        """,
+                        pending_food,
+                    ).fetchall()
+                    for drug_id in pending_food:
+                        selection.food[drug_id] = []
+                    for row in rows:
+                        selection.food[row["drug_id"]].append(clean_text(row["description"]))
+        return []
+
+    def load_compiled_selection(
+        self,
+        snapshot: Snapshot,
+        selection: Selection,
+        ids: list[str],
+        *,
+        interactions: bool,
+        food: bool,
+    ) -> list[str]:
+        indexes = {drug_id: snapshot.drug_index(drug_id) for drug_id in ids}
+        missing = [drug_id for drug_id, index in indexes.items() if index is None]
+        if missing:
+            return missing
+
+        for drug_id in ids:
+            if drug_id not in selection.drugs:
+                index = indexes[drug_id]
+                selection.drugs[drug_id] = snapshot.drug(index)
+                selection.profiles[drug_id] = snapshot.profile(index)
+                selection.texts[drug_id] = snapshot.texts(index)
+        if interactions:
+            new_side = [drug_id for drug_id in ids if drug_id not in selection.paired]
+            for drug1_id in new_side:
+                for drug2_id in ids:
+                    if drug1_id != drug2_id:
+                        pair = frozenset((drug1_id, drug2_id))
+                        selection.interactions[pair] = snapshot.interaction(indexes[drug1_id], indexes[drug2_id])
+            selection.paired.update(new_side)
+        if food:
+            for drug_id in ids:
+                if drug_id not in selection.food:
+                    selection.food[drug_id] = snapshot.food(indexes[drug_id])
+        return []
+
+    def profile(self, selection: Selection, drug_id: str) -> dict:
+        if drug_id not in selection.profiles:
+            selection.profiles[drug_id] = row_to_drug(selection.drugs[drug_id])
+        return selection.profiles[drug_id]
 
-    def check_many(self, raw_ids: str) -> dict:
+    def interaction_view(self, record: dict) -> dict:
+        return {
+            "description": record["description"],
+            "severity": record["severity"],
+            "label": record["label"],
+        }
+
+    def check_many(self, raw_ids: str, selection: Selection | None = None) -> dict:
         ids: list[str] = []
         for drug_id in raw_ids.split(","):
             clean_id = drug_id.strip()
@@ -362,58 +2104,29 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
         if len(ids) > 12:
             return {"error": "Please check 12 drugs or fewer at a time."}
 
-        placeholders = ",".join("?" for _ in ids)
-        with get_db() as db:
-            drug_rows = db.execute(
-                f"""
-                SELECT * FROM drugs
-                WHERE drugbank_id IN ({placeholders})
-                """,
-                ids,
-            ).fetchall()
-            drugs_by_id = {row["drugbank_id"]: row for row in drug_rows}
-
-            missing = [drug_id for drug_id in ids if drug_id not in drugs_by_id]
+        selection = selection or Selection()
+        with selection.lock:
+            missing = self.load_selection(selection, ids, interactions=True)
             if missing:
                 return {"error": f"Could not find: {', '.join(missing)}"}
 
-            interaction_rows = db.execute(
-                f"""
-                SELECT drug1_id, drug2_id, description
-                FROM drug_interactions
-                WHERE drug1_id IN ({placeholders})
-                  AND drug2_id IN ({placeholders})
-                """,
-                [*ids, *ids],
-            ).fetchall()
-
-        interactions: dict[frozenset[str], sqlite3.Row] = {}
-        for row in interaction_rows:
-            key = frozenset((row["drug1_id"], row["drug2_id"]))
-            interactions.setdefault(key, row)
-
-        pairs = []
-        for index, drug1_id in enumerate(ids):
-            for drug2_id in ids[index + 1 :]:
-                row = interactions.get(frozenset((drug1_id, drug2_id)))
-                drug1 = row_to_drug(drugs_by_id[drug1_id])
-                drug2 = row_to_drug(drugs_by_id[drug2_id])
-                item = {
-                    "drug1": drug1,
-                    "drug2": drug2,
-                    "found": row is not None,
-                }
-                if row is not None:
-                    level, label = severity_for(row["description"])
-                    item["interaction"] = {
-                        "description": clean_text(row["description"]),
-                        "severity": level,
-                        "label": label,
+            pairs = []
+            for index, drug1_id in enumerate(ids):
+                for drug2_id in ids[index + 1 :]:
+                    row = selection.interactions[frozenset((drug1_id, drug2_id))]
+                    item = {
+                        "drug1": self.profile(selection, drug1_id),
+                        "drug2": self.profile(selection, drug2_id),
+                        "found": row is not None,
                     }
-                pairs.append(item)
+                    if row is not None:
+                        item["interaction"] = self.interaction_view(row)
+                    pairs.append(item)
+
+            drugs = [self.profile(selection, drug_id) for drug_id in ids]
 
         return {
-            "drugs": [row_to_drug(drugs_by_id[drug_id]) for drug_id in ids],
+            "drugs": drugs,
             "pairs": pairs,
             "summary": {
                 "selected": len(ids),
@@ -470,150 +2183,141 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             return "low"
         return "none"
 
-    def patient_risk(self, raw_ids: str, raw_contexts: str) -> dict:
-        ids, error = self.parsed_ids(raw_ids)
-        if error:
-            return {"error": error}
-
-        contexts = self.parsed_contexts(raw_contexts)
-        if not contexts:
-            return {"error": "Select at least one patient context."}
-
-        placeholders = ",".join("?" for _ in ids)
-        with get_db() as db:
-            drug_rows = db.execute(
-                f"""
-                SELECT drugbank_id, name, description, indication, pharmacodynamics,
-                       mechanism_of_action, toxicity, metabolism, absorption,
-                       half_life, route_of_elimination
-                FROM drugs
-                WHERE drugbank_id IN ({placeholders})
-                """,
-                ids,
-            ).fetchall()
-            drugs_by_id = {row["drugbank_id"]: row for row in drug_rows}
-            if len(drugs_by_id) != len(ids):
-                return {"error": "One or more selected drugs could not be found."}
-
-            food_rows = db.execute(
-                f"""
-                SELECT drug_id, description
-                FROM food_interactions
-                WHERE drug_id IN ({placeholders})
-                """,
-                ids,
-            ).fetchall()
-            interaction_rows = db.execute(
-                f"""
-                SELECT drug1_id, drug2_id, description
-                FROM drug_interactions
-                WHERE drug1_id IN ({placeholders})
-                  AND drug2_id IN ({placeholders})
-                """,
-                [*ids, *ids],
-            ).fetchall()
-
-        field_map = {
-            "description": "Description",
-            "indication": "Indication",
-            "pharmacodynamics": "Pharmacodynamics",
-            "mechanism_of_action": "Mechanism",
-            "toxicity": "Toxicity",
-            "metabolism": "Metabolism",
-            "absorption": "Absorption",
-            "half_life": "Half-life",
-            "route_of_elimination": "Elimination",
-        }
-
-        context_results = []
-        all_signals = []
-        for context in contexts:
-            rule = PATIENT_CONTEXT_RULES[context]
-            terms = rule["terms"]
-            signals = []
-            context_points = 0
-
-            for drug_id in ids:
-                drug = drugs_by_id[drug_id]
-                for field, label in field_map.items():
-                    text = clean_text(drug[field])
-                    if not text:
-                        continue
-                    lower = text.lower()
-                    matched = [term for term in terms if term in lower]
-                    if not matched:
-                        continue
-                    escalator_points = sum(points for term, points in RISK_ESCALATORS.items() if term in lower)
-                    points = min(rule["points"] + escalator_points, 24)
-                    signal = {
-                        "drugId": drug_id,
-                        "drugName": drug["name"] or drug_id,
-                        "source": label,
-                        "matched": matched[:4],
-                        "excerpt": self.evidence_excerpt(text, terms),
-                        "points": points,
-                    }
-                    signals.append(signal)
-                    context_points += points
-
-            for row in food_rows:
-                text = clean_text(row["description"])
-                lower = text.lower()
-                matched = [term for term in terms if term in lower]
-                if not matched:
-                    continue
-                drug = drugs_by_id[row["drug_id"]]
-                points = min(rule["points"] + 3, 18)
-                signal = {
-                    "drugId": row["drug_id"],
-                    "drugName": drug["name"] or row["drug_id"],
+    def drug_texts(self, selection: Selection, drug_id: str) -> dict[str, str]:
+        if drug_id not in selection.texts:
+            drug = selection.drugs[drug_id]
+            selection.texts[drug_id] = {field: clean_text(drug[field]) for field in PATIENT_FIELDS}
+        return selection.texts[drug_id]
+
+    def field_signals(self, selection: Selection, drug_id: str, context: str) -> list[dict]:
+        key = (drug_id, context)
+        if key in selection.field_signals:
+            return selection.field_signals[key]
+
+        rule = PATIENT_CONTEXT_RULES[context]
+        terms = rule["terms"]
+        drug = selection.drugs[drug_id]
+        signals = []
+        for field, text in self.drug_texts(selection, drug_id).items():
+            if not text:
+                continue
+            lower = text.lower()
+            matched = [term for term in terms if term in lower]
+            if not matched:
+                continue
+            signals.append(
+                {
+                    "drugId": drug_id,
+                    "drugName": drug["name"] or drug_id,
+                    "source": PATIENT_FIELDS[field],
+                    "matched": matched[:4],
+                    "excerpt": self.evidence_excerpt(text, terms),
+                    "points": field_points(rule, lower),
+                }
+            )
+        selection.field_signals[key] = signals
+        return signals
+
+    def food_signals(self, selection: Selection, drug_id: str, context: str) -> list[dict]:
+        key = (drug_id, context)
+        if key in selection.food_signals:
+            return selection.food_signals[key]
+
+        rule = PATIENT_CONTEXT_RULES[context]
+        terms = rule["terms"]
+        drug = selection.drugs[drug_id]
+        signals = []
+        for text in selection.food[drug_id]:
+            lower = text.lower()
+            matched = [term for term in terms if term in lower]
+            if not matched:
+                continue
+            signals.append(
+                {
+                    "drugId": drug_id,
+                    "drugName": drug["name"] or drug_id,
                     "source": "Food interaction",
                     "matched": matched[:4],
                     "excerpt": self.evidence_excerpt(text, terms),
-                    "points": points,
+                    "points": food_points(rule),
                 }
-                signals.append(signal)
-                context_points += points
-
-            unique_interactions: dict[frozenset[str], sqlite3.Row] = {}
-            for row in interaction_rows:
-                unique_interactions.setdefault(frozenset((row["drug1_id"], row["drug2_id"])), row)
-
-            for row in unique_interactions.values():
-                text = clean_text(row["description"])
-                lower = text.lower()
-                matched = [term for term in terms if term in lower]
-                if not matched:
-                    continue
+            )
+        selection.food_signals[key] = signals
+        return signals
+
+    def pair_signal(self, selection: Selection, pair: frozenset[str], context: str) -> dict | None:
+        key = (pair, context)
+        if key in selection.pair_signals:
+            return selection.pair_signals[key]
+
+        row = selection.interactions[pair]
+        signal = None
+        if row is not None:
+            rule = PATIENT_CONTEXT_RULES[context]
+            terms = rule["terms"]
+            text = row["description"]
+            lower = text.lower()
+            matched = [term for term in terms if term in lower]
+            if matched:
                 severity, label = severity_for(text)
-                points = rule["points"] + (12 if severity == "high" else 6 if severity == "moderate" else 3)
                 signal = {
                     "drugId": f"{row['drug1_id']}+{row['drug2_id']}",
-                    "drugName": f"{drugs_by_id[row['drug1_id']]['name']} + {drugs_by_id[row['drug2_id']]['name']}",
+                    "drugName": f"{selection.drugs[row['drug1_id']]['name']} + {selection.drugs[row['drug2_id']]['name']}",
                     "source": f"Pair interaction · {label}",
                     "matched": matched[:4],
                     "excerpt": self.evidence_excerpt(text, terms),
-                    "points": min(points, 28),
+                    "points": pair_points(rule, severity),
                 }
-                signals.append(signal)
-                context_points += signal["points"]
-
-            signals.sort(key=lambda item: (-item["points"], item["drugName"], item["source"]))
-            score = min(100, context_points)
-            context_result = {
-                "id": context,
-                "label": rule["label"],
-                "score": score,
-                "level": self.risk_level(score),
-                "monitor": rule["monitor"],
-                "signalCount": len(signals),
-                "signals": signals[:8],
-            }
-            context_results.append(context_result)
-            all_signals.extend(signals)
+        selection.pair_signals[key] = signal
+        return signal
+
+    def patient_risk(self, raw_ids: str, raw_contexts: str, selection: Selection | None = None) -> dict:
+        ids, error = self.parsed_ids(raw_ids)
+        if error:
+            return {"error": error}
+
+        contexts = self.parsed_contexts(raw_contexts)
+        if not contexts:
+            return {"error": "Select at least one patient context."}
+
+        selection = selection or Selection()
+        with selection.lock:
+            if self.load_selection(selection, ids, interactions=True, food=True):
+                return {"error": "One or more selected drugs could not be found."}
+
+            pairs = [
+                frozenset((drug1_id, drug2_id))
+                for index, drug1_id in enumerate(ids)
+                for drug2_id in ids[index + 1 :]
+            ]
+            context_results = []
+            signal_count = 0
+            for context in contexts:
+                rule = PATIENT_CONTEXT_RULES[context]
+                signals = [signal for drug_id in ids for signal in self.field_signals(selection, drug_id, context)]
+                signals.extend(signal for drug_id in ids for signal in self.food_signals(selection, drug_id, context))
+                for pair in pairs:
+                    signal = self.pair_signal(selection, pair, context)
+                    if signal is not None:
+                        signals.append(signal)
+
+                context_points = sum(signal["points"] for signal in signals)
+                signals.sort(key=lambda item: (-item["points"], item["drugName"], item["source"]))
+                score = min(100, context_points)
+                context_result = {
+                    "id": context,
+                    "label": rule["label"],
+                    "score": score,
+                    "level": self.risk_level(score),
+                    "monitor": rule["monitor"],
+                    "signalCount": len(signals),
+                    "signals": signals[:8],
+                }
+                context_results.append(context_result)
+                signal_count += len(signals)
 
         context_results.sort(key=lambda item: (-item["score"], item["label"]))
-        overall_score = min(100, sum(item["score"] for item in context_results) // max(1, len(context_results)) + min(20, len(all_signals) * 2))
+        overall_score = min(100, sum(item["score"] for item in context_results) // max(1, len(context_results)) + min(20, signal_count * 2))
         top_context = context_results[0] if context_results else None
         explanation = [
             "The model scans local DrugBank text fields for patient-context terms, then attaches evidence snippets from the exact fields that matched.",
@@ -637,126 +2341,74 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             "contexts": context_results,
             "explanation": explanation,
             "method": {
-                "fieldsScanned": list(field_map.values()) + ["Food interaction", "Pair interaction"],
+                "fieldsScanned": list(PATIENT_FIELDS.values()) + ["Food interaction", "Pair interaction"],
                 "escalators": list(RISK_ESCALATORS.keys()),
                 "scoreRange": "0-100",
             },
         }
 
-    def ai_insights(self, raw_ids: str) -> dict:
+    def ai_insights(self, raw_ids: str, selection: Selection | None = None) -> dict:
         ids, error = self.parsed_ids(raw_ids)
         if error:
             return {"error": error}
 
-        placeholders = ",".join("?" for _ in ids)
-        with get_db() as db:
-            drug_rows = db.execute(
-                f"SELECT drugbank_id, name FROM drugs WHERE drugbank_id IN ({placeholders})",
-                ids,
-            ).fetchall()
-            drugs_by_id = {row["drugbank_id"]: row["name"] or row["drugbank_id"] for row in drug_rows}
-            if len(drugs_by_id) != len(ids):
+        selection = selection or Selection()
+        with selection.lock:
+            if self.load_selection(selection, ids, interactions=True, food=True):
                 return {"error": "One or more selected drugs could not be found."}
 
-            interaction_rows = db.execute(
-                f"""
-                SELECT drug1_id, drug2_id, description
-                FROM drug_interactions
-                WHERE drug1_id IN ({placeholders})
-                  AND drug2_id IN ({placeholders})
-                """,
-                [*ids, *ids],
-            ).fetchall()
-            food_rows = db.execute(
-                f"""
-                SELECT drug_id, description
-                FROM food_interactions
-                WHERE drug_id IN ({placeholders})
-                ORDER BY drug_id
-                """,
-                ids,
-            ).fetchall()
-            category_rows = db.execute(
-                f"""
-                SELECT drug_id, category AS item
-                FROM categories
-                WHERE drug_id IN ({placeholders})
-                """,
-                ids,
-            ).fetchall()
-            target_rows = db.execute(
-                f"""
-                SELECT drug_id, name AS item
-                FROM targets
-                WHERE drug_id IN ({placeholders})
-                """,
-                ids,
-            ).fetchall()
-            enzyme_rows = db.execute(
-                f"""
-                SELECT drug_id, name AS item
-                FROM enzymes
-                WHERE drug_id IN ({placeholders})
-                """,
-                ids,
-            ).fetchall()
-
-        interaction_by_pair: dict[frozenset[str], sqlite3.Row] = {}
-        for row in interaction_rows:
-            interaction_by_pair.setdefault(frozenset((row["drug1_id"], row["drug2_id"])), row)
-
-        edges = []
-        found_edges = []
-        high_count = 0
-        for index, drug1_id in enumerate(ids):
-            for drug2_id in ids[index + 1 :]:
-                row = interaction_by_pair.get(frozenset((drug1_id, drug2_id)))
-                edge = {
-                    "source": drug1_id,
-                    "target": drug2_id,
-                    "sourceName": drugs_by_id[drug1_id],
-                    "targetName": drugs_by_id[drug2_id],
-                    "found": row is not None,
-                    "severity": "none",
-                    "label": "No listed interaction",
-                    "description": "",
-                }
-                if row is not None:
-                    severity, label = severity_for(row["description"])
-                    edge.update(
-                        {
-                            "found": True,
-                            "severity": severity,
-                            "label": label,
-                            "description": clean_text(row["description"]),
-                        }
-                    )
-                    found_edges.append(edge)
-                    if severity == "high":
-                        high_count += 1
-                edges.append(edge)
-
-        food_by_drug: dict[str, list[str]] = {drug_id: [] for drug_id in ids}
-        for row in food_rows:
-            food_by_drug[row["drug_id"]].append(clean_text(row["description"]))
-
-        def shared_items(rows: list[sqlite3.Row], limit: int = 8) -> list[dict]:
-            item_map: dict[str, set[str]] = {}
-            for row in rows:
-                item = clean_text(row["item"])
-                if item:
-                    item_map.setdefault(item, set()).add(row["drug_id"])
-            shared = [
-                {
-                    "name": item,
-                    "drugs": [drugs_by_id[drug_id] for drug_id in drug_ids if drug_id in drugs_by_id],
-                }
-                for item, drug_ids in item_map.items()
-                if len(drug_ids) > 1
-            ]
-            shared.sort(key=lambda item: (-len(item["drugs"]), item["name"].lower()))
-            return shared[:limit]
-
+            drugs_by_id = {drug_id: selection.drugs[drug_id]["name"] or drug_id for drug_id in ids}
+            graph = self.mechanism_graph(ids)
+            edges = []
+            found_edges = []
+            inferred_edges = []
+            high_count = 0
+            for index, drug1_id in enumerate(ids):
+                for drug2_id in ids[index + 1 :]:
+                    row = selection.interactions[frozenset((drug1_id, drug2_id))]
+                    pathways = graph.pathways((drug1_id, drugs_by_id[drug1_id]), (drug2_id, drugs_by_id[drug2_id]))
+                    if pathways:
+                        severity = pathways[0]["severity"]
+                        inferred_edges.append(
+                            {
+                                "source": drug1_id,
+                                "target": drug2_id,
+                                "sourceName": drugs_by_id[drug1_id],
+                                "targetName": drugs_by_id[drug2_id],
+                                "listed": row is not None,
+                                "severity": severity,
+                                "label": "Inferred · Monitor" if severity == "moderate" else "Inferred · Review",
+                                "description": "; ".join(pathway["effect"] for pathway in pathways[:3]),
+                                "pathways": pathways,
+                            }
+                        )
+                    edge = {
+                        "source": drug1_id,
+                        "target": drug2_id,
+                        "sourceName": drugs_by_id[drug1_id],
+                        "targetName": drugs_by_id[drug2_id],
+                        "found": row is not None,
+                        "severity": "none",
+                        "label": "No listed interaction",
+                        "description": "",
+                    }
+                    if row is not None:
+                        view = self.interaction_view(row)
+                        edge.update({"found": True, **view})
+                        found_edges.append(edge)
+                        if view["severity"] == "high":
+                            high_count += 1
+                    edges.append(edge)
+
+            food_by_drug = {drug_id: selection.food[drug_id] for drug_id in ids}
+
+        ranked, shared_counts = self.shared_index(ids).shared(ids)
+        shared = {
+            kind: [{"name": name, "drugs": [drugs_by_id[ids[index]] for index in sharing]} for name, sharing in items]
+            for kind, items in ranked.items()
+        }
+        for edge in edges:
+            edge["sharedItems"] = shared_counts[ids.index(edge["source"])][ids.index(edge["target"])]
         total_pairs = (len(ids) * (len(ids) - 1)) // 2
         food_count = sum(len(items) for items in food_by_drug.values())
         summary = []
@@ -770,7 +2422,10 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             summary.append("No high-attention keyword pattern was detected in the selected interaction descriptions.")
         if food_count:
             summary.append(f"{food_count} food or supplement warning(s) were found for the selected drugs.")
-        if len(shared_items(target_rows, 3)) or len(shared_items(enzyme_rows, 3)):
+        unlisted = [edge for edge in inferred_edges if not edge["listed"]]
+        if unlisted:
+            summary.append(f"{len(unlisted)} pair(s) without a listed interaction share an enzyme, transporter, carrier or target pathway; these are inferred, not documented.")
+        if shared["targets"] or shared["enzymes"]:
             summary.append("Shared target or enzyme signals suggest possible mechanistic overlap worth reviewing.")
         else:
             summary.append("No shared target/enzyme overlap was detected from the available structured fields.")
@@ -779,6 +2434,7 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             "mode": "Local AI-style risk summarizer",
             "nodes": [{"id": drug_id, "name": drugs_by_id[drug_id]} for drug_id in ids],
             "edges": edges,
+            "inferredEdges": inferred_edges,
             "summary": summary,
             "foodWarnings": [
                 {
@@ -789,11 +2445,7 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
                 for drug_id, warnings in food_by_drug.items()
                 if warnings
             ],
-            "shared": {
-                "categories": shared_items(category_rows),
-                "targets": shared_items(target_rows),
-                "enzymes": shared_items(enzyme_rows),
-            },
+            "shared": shared,
             "topInteractions": found_edges[:6],
         }
 
@@ -803,14 +2455,15 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
         if drug1 == drug2:
             return {"error": "Choose two different drugs."}
 
-        with get_db() as db:
+        with self.connect() as db:
             d1 = db.execute("SELECT * FROM drugs WHERE drugbank_id = ?", (drug1,)).fetchone()
             d2 = db.execute("SELECT * FROM drugs WHERE drugbank_id = ?", (drug2,)).fetchone()
             interaction = db.execute(
-                """
+                f"""
                 SELECT * FROM drug_interactions
                 WHERE (drug1_id = ? AND drug2_id = ?)
                    OR (drug1_id = ? AND drug2_id = ?)
+                ORDER BY {PAIR_ORDER}
                 LIMIT 1
                 """,
                 (drug1, drug2, drug2, drug1),
@@ -837,7 +2490,7 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
         if not drug_id:
             return {"error": "Choose a drug first."}
 
-        with get_db() as db:
+        with self.connect() as db:
             drug = db.execute("SELECT drugbank_id, name FROM drugs WHERE drugbank_id = ?", (drug_id,)).fetchone()
             if drug is None:
                 return {"error": "Drug not found."}
@@ -906,7 +2559,7 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
         }
 
     def drug_detail(self, drug_id: str) -> dict:
-        with get_db() as db:
+        with self.connect() as db:
             drug = db.execute("SELECT * FROM drugs WHERE drugbank_id = ?", (drug_id,)).fetchone()
             if drug is None:
                 return {"error": "Drug not found."}
@@ -997,6 +2650,18 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             "interactionCount": interaction_count,
         }
 
+    def drug_details(self, raw_ids: str, max_ids: int = 12) -> dict:
+        ids: list[str] = []
+        for drug_id in raw_ids.split(","):
+            clean_id = drug_id.strip()
+            if clean_id and clean_id not in ids:
+                ids.append(clean_id)
+        if not ids:
+            return {"error": "Choose a drug first."}
+        if len(ids) > max_ids:
+            return {"error": f"Please use {max_ids} drugs or fewer."}
+        return {"drugs": {drug_id: self.drug_detail(drug_id) for drug_id in ids}}
+
     def drug_interactions(self, drug_id: str, query: str) -> dict:
         q = " ".join(query.strip().split())
         values: list[str] = [drug_id, drug_id]
@@ -1005,7 +2670,7 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             name_filter = "AND other.name LIKE ?"
             values.append(f"%{q}%")
 
-        with get_db() as db:
+        with self.connect() as db:
             rows = db.execute(
                 f"""
                 WITH paired AS (
@@ -1044,13 +2709,695 @@ class NeuroPharmHandler(BaseHTTPRequestHandler):
             ]
         }
 
+    def resolve_medications(self, medications: str) -> tuple[list[str], list[str]]:
+        names = self.name_index()
+        resolved: list[str] = []
+        unresolved: list[str] = []
+        for name in split_list(medications):
+            drug_id = names.get(name.casefold())
+            if drug_id is None:
+                unresolved.append(name)
+            elif drug_id not in resolved:
+                resolved.append(drug_id)
+        return resolved, unresolved
+
+    def audit_patient(self, patient_id: str, medications: str, contexts: str, scorer: RiskScorer | None = None) -> dict:
+        resolved, unresolved = self.resolve_medications(medications)
+
+        result = {
+            "patient_id": patient_id,
+            "resolved": resolved,
+            "unresolved": unresolved,
+            "pairs": [],
+            "summary": {"checked": 0, "found": 0, "high": 0, "moderate": 0, "informational": 0},
+            "risk": None,
+            "error": None,
+        }
+        # Same checks and messages as check_many, but severities come from the
+        # scorer's pair cache: the output has no use for drug profiles.
+        if len(resolved) < 2:
+            result["error"] = "Select at least two drugs to check."
+            return result
+        if len(resolved) > 12:
+            result["error"] = "Please check 12 drugs or fewer at a time."
+            return result
+        scorer = scorer or RiskScorer(self)
+        missing, pairs = scorer.interactions(resolved)
+        if missing:
+            result["error"] = f"Could not find: {', '.join(missing)}"
+            return result
+
+        summary = result["summary"]
+        summary["checked"] = len(pairs)
+        for drug1_id, drug2_id, severity in pairs:
+            if severity is None:
+                continue
+            summary["found"] += 1
+            summary[severity] += 1
+            result["pairs"].append({"drug1": drug1_id, "drug2": drug2_id, "severity": severity})
+
+        raw_ids = ",".join(resolved)
+        risk = self.risk_scores(scorer, raw_ids, contexts)
+        if risk.get("error"):
+            result["error"] = risk["error"]
+            return result
+        result["risk"] = {
+            "score": risk["overall"]["score"],
+            "level": risk["overall"]["level"],
+            "contexts": {item["id"]: item["score"] for item in risk["contexts"]},
+        }
+        return result
+
+    def audit_batch(self, rows: Iterator[dict], chunk_size: int = AUDIT_CHUNK_SIZE) -> Iterator[dict]:
+        self.name_index()
+        scorer = RiskScorer(self)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            scorer.prepare([self.resolve_medications(row["medications"])[0] for row in chunk])
+            for row in chunk:
+                yield self.audit_patient(row["patient_id"], row["medications"], row["contexts"], scorer)
+
+    def risk_scores(self, scorer: RiskScorer, raw_ids: str, raw_contexts: str) -> dict:
+        ids, error = self.parsed_ids(raw_ids)
+        if error:
+            return {"error": error}
+        contexts = self.parsed_contexts(raw_contexts)
+        if not contexts:
+            return {"error": "Select at least one patient context."}
+        return scorer.score(ids, contexts)
+
+    def risk_batch(self, lines: Iterator[tuple[int, str]], contexts: list[str], chunk_size: int = AUDIT_CHUNK_SIZE) -> Iterator[dict]:
+        """Scores for numbered lines of comma-separated drug IDs, one regimen each."""
+        scorer = RiskScorer(self)
+        while True:
+            chunk = [(number, *self.parsed_ids(line)) for number, line in islice(lines, chunk_size)]
+            if not chunk:
+                return
+            scorer.prepare([ids for _, ids, error in chunk if error is None])
+            for number, ids, error in chunk:
+                yield {"line": number, "ids": ids, **({"error": error} if error else scorer.score(ids, contexts))}
+
+    def audit_stages(
+        self,
+        names: list[str],
+        raw_contexts: str,
+        selection: Selection | None = None,
+    ) -> Iterator[tuple[str, dict]]:
+        matches = []
+        missing = []
+        for name in names[:12]:
+            results = self.search(name)["results"]
+            drug = results[0] if results else None
+            if drug and not any(match["drug"]["id"] == drug["id"] for match in matches):
+                matches.append({"input": name, "drug": drug})
+            else:
+                missing.append(name)
+        yield "resolved", {"matches": matches, "missing": missing}
+        if len(matches) < 2:
+            yield "failed", {"error": "Audit needs at least two matched medicines."}
+            return
+
+        ids = ",".join(match["drug"]["id"] for match in matches)
+        selection = selection or Selection()
+        pairs = self.check_many(ids, selection)
+        yield "pairs", pairs
+        if pairs.get("error"):
+            return
+        yield "insights", self.ai_insights(ids, selection)
+        if self.parsed_contexts(raw_contexts):
+            yield "risk", self.patient_risk(ids, raw_contexts, selection)
+        else:
+            yield "risk", {"skipped": True}
+        yield "alternatives", self.similar_drugs(matches[0]["drug"]["id"])
+
+    def recorded_audit(
+        self,
+        names: list[str],
+        raw_contexts: str,
+        selection: Selection | None = None,
+        patient: str = "",
+    ) -> Iterator[tuple[str, dict]]:
+        stages = self.audit_stages(names, raw_contexts, selection)
+        event, resolved = next(stages)
+        yield event, resolved
+        if AUDIT_HISTORY is None or len(resolved["matches"]) < 2:
+            yield from stages
+            return
+
+        drug_ids = [match["drug"]["id"] for match in resolved["matches"]]
+        contexts = self.parsed_contexts(raw_contexts)
+        case = {
+            "id": uuid.uuid4().hex,
+            "resultKey": AUDIT_HISTORY.key(drug_ids, contexts, database_version()),
+            "dbStamp": database_version(),
+            "patient": patient.strip()[:120],
+            "inputs": names[:12],
+            "drugIds": drug_ids,
+            "drugNames": [match["drug"]["name"] for match in resolved["matches"]],
+            "contexts": contexts,
+            "createdAt": time.time(),
+        }
+        saved = AUDIT_HISTORY.result(case["resultKey"])
+        if saved is not None:
+            stages.close()
+            AUDIT_HISTORY.save(case, None)
+            yield "history", {"caseId": case["id"], "reopened": True, "savedAt": saved["savedAt"]}
+            yield from saved["stages"].items()
+            return
+
+        computed: dict[str, dict] = {}
+        for event, payload in stages:
+            computed[event] = payload
+            yield event, payload
+        if "failed" not in computed and not computed.get("pairs", {}).get("error"):
+            AUDIT_HISTORY.save(case, computed)
+            yield "history", {"caseId": case["id"], "reopened": False}
+
+
+class NeuroPharmHandler(NeuroPharmAPI, BaseHTTPRequestHandler):
+    server_version = "NeuroPharmDB/1.0"
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this the second one
+    # waits on the client's delayed ACK.
+    disable_nagle_algorithm = True
+    # Idle keep-alive connections give their thread back after this long.
+    timeout = KEEPALIVE_SECONDS
+    response_status = 0
+    response_bytes = 0
+    profile_id = ""
+    connection_header = False
+    body_reader: LimitedReader | ChunkedReader | None = None
+
+    def do_GET(self) -> None:
+        self.observe(self.handle_get)
+
+    def do_POST(self) -> None:
+        self.observe(self.handle_post)
+
+    def observe(self, handler: Callable[[], None]) -> None:
+        reload_if_swapped()
+        self.response_status = 0
+        self.response_bytes = 0
+        self.profile_id = ""
+        self.body_reader = None
+        if self.profile_requested() or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+            handler = partial(self.run_profiled, handler)
+        if not METRICS.enabled:
+            handler()
+            WARMUP.responded()
+            return
+
+        route = route_label(unquote(urlparse(self.path).path))
+        started = time.perf_counter()
+        METRICS.request_started()
+        try:
+            handler()
+        finally:
+            METRICS.request_finished(route, self.command, self.response_status, time.perf_counter() - started, self.response_bytes)
+        WARMUP.responded()
+
+    def is_admin(self, token: str) -> bool:
+        return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+    def profile_requested(self) -> bool:
+        parsed = urlparse(self.path)
+        if parsed.path.startswith("/api/profiles/"):
+            return False
+        # Header only: request lines, query strings included, end up in logs.
+        token = self.headers.get("X-Profile", "")
+        return bool(token) and self.is_admin(token)
+
+    def run_profiled(self, handler: Callable[[], None]) -> None:
+        if not PROFILE_SLOTS.acquire(blocking=False):
+            handler()
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool, such as a debugger, holds sys.monitoring.
+            PROFILE_SLOTS.release()
+            handler()
+            return
+        route = route_label(unquote(urlparse(self.path).path)).strip("/").replace("/", "-").replace("<", "").replace(">", "")
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{route or 'index'}-{os.urandom(4).hex()}"
+        try:
+            handler()
+        finally:
+            profiler.disable()
+            PROFILE_SLOTS.release()
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(PROFILE_DIR / f"{self.profile_id}.pstats")
+            prune_profiles()
+
+    def end_headers(self) -> None:
+        if self.profile_id:
+            self.send_header("X-Profile-Id", self.profile_id)
+        # A body nobody started reading would be parsed as the next request.
+        if self.body_reader is None and self.body_pending():
+            self.close_connection = True
+        if self.close_connection and not self.connection_header:
+            self.send_header("Connection", "close")
+        super().end_headers()
+
+    def send_header(self, keyword: str, value: str) -> None:
+        if keyword.lower() == "connection":
+            self.connection_header = True
+        super().send_header(keyword, value)
+
+    def body_pending(self) -> bool:
+        if self.body_reader is not None:
+            return not self.body_reader.exhausted
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            return True
+        return self.headers.get("Content-Length", "0").strip() not in ("", "0")
+
+    def send_response(self, code: int, message: str | None = None) -> None:
+        self.response_status = code
+        self.connection_header = False
+        super().send_response(code, message)
+
+    def handle_get(self) -> None:
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+
+        try:
+            if path == "/":
+                self.send_index()
+            elif path.startswith("/static/"):
+                self.send_static(path.removeprefix("/static/"))
+            elif path == "/api/metrics" and METRICS.enabled:
+                self.send_metrics()
+            elif path.startswith("/api/profiles/"):
+                self.send_profile(path.removeprefix("/api/profiles/"))
+            elif path == "/api/health":
+                self.send_json(self.health())
+            elif path == "/api/stats":
+                self.send_json(self.stats())
+            elif path == "/api/search":
+                params = parse_qs(parsed.query)
+                self.send_json(self.search(params.get("q", [""])[0]))
+            elif path == "/api/options":
+                params = parse_qs(parsed.query)
+                self.send_json(self.options(params.get("q", [""])[0]))
+            elif path == "/api/check":
+                params = parse_qs(parsed.query)
+                self.send_json(
+                    self.check_pair(
+                        params.get("drug1", [""])[0],
+                        params.get("drug2", [""])[0],
+                    )
+                )
+            elif path == "/api/check-many":
+                params = parse_qs(parsed.query)
+                self.send_json(
+                    self.check_many(
+                        params.get("ids", [""])[0],
+                        self.selection(params.get("selection", [""])[0]),
+                    )
+                )
+            elif path == "/api/ai-insights":
+                params = parse_qs(parsed.query)
+                self.send_json(
+                    self.ai_insights(
+                        params.get("ids", [""])[0],
+                        self.selection(params.get("selection", [""])[0]),
+                    )
+                )
+            elif path == "/api/patient-risk":
+                params = parse_qs(parsed.query)
+                self.send_json(
+                    self.patient_risk(
+                        params.get("ids", [""])[0],
+                        params.get("contexts", [""])[0],
+                        self.selection(params.get("selection", [""])[0]),
+                    )
+                )
+            elif path == "/api/audit/stream":
+                params = parse_qs(parsed.query)
+                self.send_event_stream(
+                    self.recorded_audit(
+                        [name.strip() for name in params.get("names", []) if name.strip()],
+                        params.get("contexts", [""])[0],
+                        self.selection(params.get("selection", [""])[0]),
+                        params.get("patient", [""])[0],
+                    )
+                )
+            elif path == "/api/audits" and AUDIT_HISTORY is not None:
+                params = parse_qs(parsed.query)
+                limit = params.get("limit", ["50"])[0]
+                self.send_json(AUDIT_HISTORY.cases(params.get("q", [""])[0], int(limit) if limit.isdigit() else 50))
+            elif path.startswith("/api/audits/") and AUDIT_HISTORY is not None:
+                result = AUDIT_HISTORY.case(path.removeprefix("/api/audits/"))
+                self.send_json(result, 404 if result.get("error") else 200)
+            elif path == "/api/similar":
+                params = parse_qs(parsed.query)
+                self.send_json(self.similar_drugs(params.get("drug", [""])[0]))
+            elif path == "/api/drugs":
+                params = parse_qs(parsed.query)
+                self.send_json(self.drug_details(params.get("ids", [""])[0]))
+            elif path.startswith("/api/drugs/") and path.endswith("/interactions"):
+                drug_id = path.removeprefix("/api/drugs/").removesuffix("/interactions").strip("/")
+                params = parse_qs(parsed.query)
+                self.send_json(self.drug_interactions(drug_id, params.get("q", [""])[0]))
+            elif path.startswith("/api/drugs/"):
+                drug_id = path.removeprefix("/api/drugs/").strip("/")
+                self.send_json(self.drug_detail(drug_id))
+            else:
+                self.send_error(404, "Not found")
+        except Exception as exc:
+            self.send_json({"error": str(exc)}, status=500)
+
+    def handle_post(self) -> None:
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+
+        try:
+            if path == "/api/audit/batch":
+                params = parse_qs(parsed.query)
+                self.send_audit_batch(params.get("contexts", ["all"])[0])
+            elif path == "/api/patient-risk/batch":
+                params = parse_qs(parsed.query)
+                self.send_risk_batch(params.get("contexts", ["all"])[0])
+            else:
+                self.send_error(404, "Not found")
+        except Exception as exc:
+            self.close_connection = True
+            self.send_json({"error": str(exc)}, status=500)
+        finally:
+            # POST handlers may answer without reading the whole body; the
+            # connection cannot be reused then.
+            if self.body_pending():
+                self.close_connection = True
+
+    def log_message(self, fmt: str, *args: object) -> None:
+        print(f"{self.address_string()} - {fmt % args}")
+
+    def send_index(self) -> None:
+        html_doc = (STATIC_DIR / "index.html").read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html_doc)))
+        self.end_headers()
+        self.wfile.write(html_doc)
+        self.response_bytes += len(html_doc)
+
+    def send_static(self, filename: str) -> None:
+        safe_path = (STATIC_DIR / filename).resolve()
+        if not str(safe_path).startswith(str(STATIC_DIR.resolve())) or not safe_path.is_file():
+            self.send_error(404, "Static file not found")
+            return
+
+        content = safe_path.read_bytes()
+        mime_type = mimetypes.guess_type(safe_path.name)[0] or "application/octet-stream"
+        self.send_response(200)
+        self.send_header("Content-Type", mime_type)
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        self.response_bytes += len(content)
+
+    def request_body(self) -> TextIO:
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            raw: LimitedReader | ChunkedReader = ChunkedReader(self.rfile)
+        else:
+            raw = LimitedReader(self.rfile, int(self.headers.get("Content-Length") or 0))
+        self.body_reader = raw
+        return io.TextIOWrapper(io.BufferedReader(raw), encoding="utf-8-sig", newline="")
+
+    def send_audit_batch(self, raw_contexts: str) -> None:
+        default_contexts = ",".join(PATIENT_CONTEXT_RULES) if raw_contexts == "all" else raw_contexts
+        body = self.request_body()
+        rows = prescription_rows(body, default_contexts)
+        started = time.perf_counter()
+        try:
+            first = next(rows)
+        except StopIteration:
+            self.send_json({"error": "Upload a CSV with patient_id, medications and contexts columns."}, status=400)
+            return
+
+        self.send_ndjson(self.audit_batch(chain([first], rows)), "patients", started)
+
+    def send_risk_batch(self, raw_contexts: str) -> None:
+        contexts = self.parsed_contexts(",".join(PATIENT_CONTEXT_RULES) if raw_contexts == "all" else raw_contexts)
+        if not contexts:
+            self.send_json({"error": "Select at least one patient context."}, status=400)
+            return
+        lines = ((number, line) for number, line in enumerate(self.request_body(), start=1) if line.strip())
+        started = time.perf_counter()
+        first = next(lines, None)
+        if first is None:
+            self.send_json({"error": "Upload one regimen per line as comma-separated drug IDs."}, status=400)
+            return
+        self.send_ndjson(self.risk_batch(chain([first], lines), contexts), "regimens", started)
+
+    def send_ndjson(self, results: Iterator[dict], counted: str, started: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+
+        count = 0
+        try:
+            for result in results:
+                count += 1
+                self.send_chunk(json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n")
+        except Exception as exc:
+            self.close_connection = True
+            self.send_chunk(json.dumps({"error": str(exc), counted: count}).encode("utf-8") + b"\n")
+        else:
+            elapsed = time.perf_counter() - started
+            self.send_chunk(json.dumps({"done": True, counted: count, "seconds": round(elapsed, 3)}).encode("utf-8") + b"\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_event_stream(self, events: Iterator[tuple[str, dict]]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        try:
+            for event, payload in events:
+                self.send_event(event, payload)
+        except Exception as exc:
+            self.close_connection = True
+            self.send_event("failed", {"error": str(exc)})
+        else:
+            self.send_event("done", {})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_event(self, event: str, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False)
+        self.send_chunk(f"event: {event}\ndata: {data}\n\n".encode("utf-8"))
+
+    def send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+        self.response_bytes += len(data)
+
+    def send_profile(self, profile_id: str) -> None:
+        if not self.is_admin(self.headers.get("X-Profile", "")):
+            self.send_error(403, "Admin token required")
+            return
+        profile_path = PROFILE_DIR / f"{profile_id}.pstats"
+        if not re.fullmatch(r"[\w.-]+", profile_id) or not profile_path.is_file():
+            self.send_error(404, "Profile not found")
+            return
+
+        report = io.StringIO()
+        pstats.Stats(str(profile_path), stream=report).sort_stats("cumulative").print_stats(40)
+        body = report.getvalue().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.response_bytes += len(body)
+
+    def send_metrics(self) -> None:
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.response_bytes += len(body)
+
+    def send_json(self, payload: dict | list, status: int = 200) -> None:
+        started = time.perf_counter()
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        if METRICS.enabled:
+            METRICS.observe_time("json_encode", time.perf_counter() - started)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("X-Database-Version", database_version())
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.response_bytes += len(body)
+
+
+class StreamBridge:
+    """Blocking file object over an asyncio connection.
+
+    NeuroPharmHandler reads request bodies from and writes responses to it.
+    Calls made on the event loop write straight to the transport. Calls from
+    an executor thread wait on the loop, so streamed responses keep their
+    back-pressure, for at most KEEPALIVE_SECONDS each, like the threading
+    server's socket timeout.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+
+    def wait(self, operation: object) -> object:
+        return asyncio.run_coroutine_threadsafe(asyncio.wait_for(operation, KEEPALIVE_SECONDS), self.loop).result()
+
+    def read(self, size: int = -1) -> bytes:
+        return self.wait(self.reader.read(size))
+
+    def readline(self, limit: int = -1) -> bytes:
+        return self.wait(self.receive_line(limit))
+
+    async def receive_line(self, limit: int) -> bytes:
+        # StreamReader.readline has no size argument; a line longer than
+        # `limit` comes back cut at `limit`, as from a buffered file.
+        if limit < 0:
+            return await self.reader.readline()
+        line = bytearray()
+        while len(line) < limit and not line.endswith(b"\n"):
+            byte = await self.reader.read(1)
+            if not byte:
+                break
+            line += byte
+        return bytes(line)
+
+    def write(self, data: bytes) -> int:
+        if threading.get_ident() == self.loop_thread:
+            self.writer.write(data)
+        else:
+            self.wait(self.send(bytes(data)))
+        return len(data)
+
+    async def send(self, data: bytes) -> None:
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def flush(self) -> None:
+        pass
+
+
+async def serve_connection(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    executor: ThreadPoolExecutor,
+    slots: asyncio.Semaphore,
+) -> None:
+    """One keep-alive connection on the event loop.
+
+    Request heads are parsed and static files served on the loop; every other
+    request runs NeuroPharmHandler.do_GET/do_POST in the bounded executor, so
+    idle and slow connections hold no thread.
+    """
+    loop = asyncio.get_running_loop()
+    stream = StreamBridge(reader, writer)
+    peer = writer.get_extra_info("peername") or ("", 0)
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_SECONDS)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                break
+
+            handler = NeuroPharmHandler.__new__(NeuroPharmHandler)
+            handler.client_address = peer[:2]
+            handler.server = None
+            handler.close_connection = True
+            handler.wfile = stream
+            handler.rfile = io.BytesIO(head)
+            handler.raw_requestline = handler.rfile.readline(REQUEST_HEAD_LIMIT + 1)
+            if not handler.parse_request():
+                await writer.drain()
+                break
+            handler.rfile = stream
+
+            method = getattr(handler, f"do_{handler.command}", None)
+            if method is None:
+                handler.send_error(501, f"Unsupported method ({handler.command!r})")
+            elif handler.command == "GET" and (handler.path == "/" or handler.path.startswith("/static/")):
+                method()
+            else:
+                async with slots:
+                    await loop.run_in_executor(executor, method)
+            await writer.drain()
+            if handler.close_connection:
+                break
+    except (ConnectionError, OSError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass
+
+
+async def start_asyncio_server(host: str, port: int, workers: int = SERVER_WORKERS) -> asyncio.Server:
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="neuropharm-worker")
+    slots = asyncio.Semaphore(workers)
+    return await asyncio.start_server(
+        partial(serve_connection, executor=executor, slots=slots), host, port, limit=REQUEST_HEAD_LIMIT
+    )
+
+
+async def serve_asyncio(host: str, port: int, workers: int) -> None:
+    server = await start_asyncio_server(host, port, workers)
+    WARMUP.start()
+    async with server:
+        await server.serve_forever()
+
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the NeuroPharmDB web app and API.")
+    parser.add_argument("--server", choices=("threading", "asyncio"), default=SERVER_MODE, help="threading: one thread per connection; asyncio: event loop with a worker pool")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Worker threads for API requests in asyncio mode")
+    args = parser.parse_args()
+
     if not DB_PATH.exists():
         raise SystemExit(f"Database not found: {DB_PATH}")
 
+    with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as db:
+        scans = full_scans(db)
+        missing = missing_indexes(db)
+    if scans:
+        print("=" * 72, file=sys.stderr)
+        print(f"WARNING: {len(scans)} API queries scan whole tables in {DB_PATH.name}:", file=sys.stderr)
+        for name, details in scans.items():
+            print(f"  {name}: {'; '.join(details)}", file=sys.stderr)
+        if missing:
+            print(f"  Missing indexes: {', '.join(missing)}", file=sys.stderr)
+        print("  Run `python3 optimize.py` to create them.", file=sys.stderr)
+        print("=" * 72, file=sys.stderr)
+
+    reload_if_swapped()
     port = int(os.environ.get("PORT", "8000"))
+    if args.server == "asyncio":
+        print(f"NeuroPharmDB running at http://127.0.0.1:{port} (asyncio, {args.workers} workers)")
+        try:
+            asyncio.run(serve_asyncio("127.0.0.1", port, args.workers))
+        except KeyboardInterrupt:
+            pass
+        return
     server = ThreadingHTTPServer(("127.0.0.1", port), NeuroPharmHandler)
+    WARMUP.start()
     print(f"NeuroPharmDB running at http://127.0.0.1:{port}")
     server.serve_forever()
 
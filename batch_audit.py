@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from collections.abc import Mapping
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+
+import app
+from app import PATIENT_CONTEXT_RULES, NeuroPharmAPI, Snapshot, load_name_index, load_snapshot, prescription_rows
+
+
+OUTPUT_FIELDS = (
+    "patient_id",
+    "resolved",
+    "unresolved",
+    "pairs_checked",
+    "interactions_found",
+    "high",
+    "moderate",
+    "informational",
+    "risk_score",
+    "risk_level",
+    "top_context",
+    "error",
+)
+
+NAME_INDEX: dict[str, str] = {}
+AUDITOR: BatchAuditor | None = None
+
+
+def connect_readonly(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class BatchAuditor(NeuroPharmAPI):
+    def __init__(self, db_path: Path, snapshot_path: Path) -> None:
+        self.db = connect_readonly(db_path)
+        self.compiled = load_snapshot(snapshot_path, db_path)
+
+    def connect(self) -> sqlite3.Connection:
+        return self.db
+
+    def snapshot(self) -> Snapshot | None:
+        return self.compiled
+
+    def name_index(self) -> Mapping[str, str]:
+        return self.compiled.names if self.compiled is not None else NAME_INDEX
+
+
+def init_worker(db_path: Path, snapshot_path: Path, name_index: dict[str, str]) -> None:
+    global AUDITOR, NAME_INDEX
+    NAME_INDEX = name_index
+    AUDITOR = BatchAuditor(db_path, snapshot_path)
+
+
+def audit_chunk(rows: list[dict]) -> list[dict]:
+    assert AUDITOR is not None
+    return list(AUDITOR.audit_batch(iter(rows), len(rows)))
+
+
+def chunked(rows: list[dict], size: int) -> Iterator[list[dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def csv_record(result: dict) -> dict:
+    risk = result["risk"] or {}
+    contexts = risk.get("contexts") or {}
+    top_context = max(contexts, key=contexts.get) if contexts else ""
+    summary = result["summary"]
+    return {
+        "patient_id": result["patient_id"],
+        "resolved": ";".join(result["resolved"]),
+        "unresolved": ";".join(result["unresolved"]),
+        "pairs_checked": summary["checked"],
+        "interactions_found": summary["found"],
+        "high": summary["high"],
+        "moderate": summary["moderate"],
+        "informational": summary["informational"],
+        "risk_score": risk.get("score", ""),
+        "risk_level": risk.get("level", ""),
+        "top_context": top_context,
+        "error": result["error"] or "",
+    }
+
+
+def load_checkpoint(path: Path) -> dict:
+    if not path.exists():
+        return {"rows": 0, "offset": 0}
+    return json.loads(path.read_text())
+
+
+def save_checkpoint(path: Path, rows: int, offset: int) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"rows": rows, "offset": offset}))
+    os.replace(tmp, path)
+
+
+def run(args: argparse.Namespace) -> None:
+    db_path = Path(args.db)
+    if not db_path.exists():
+        raise SystemExit(f"Database not found: {db_path}")
+
+    output = Path(args.output)
+    fmt = args.format or ("csv" if output.suffix.lower() == ".csv" else "ndjson")
+    checkpoint = Path(args.checkpoint or f"{output}.checkpoint")
+    state = load_checkpoint(checkpoint) if args.resume else {"rows": 0, "offset": 0}
+    default_contexts = ",".join(PATIENT_CONTEXT_RULES) if args.contexts == "all" else args.contexts
+
+    snapshot_path = Path(args.snapshot or db_path.with_suffix(".snapshot"))
+    snapshot = load_snapshot(snapshot_path, db_path)
+    name_index: dict[str, str] = {}
+    if snapshot is not None:
+        print(f"Using compiled snapshot {snapshot_path}", file=sys.stderr)
+        snapshot.close()
+    else:
+        started = time.perf_counter()
+        with connect_readonly(db_path) as db:
+            name_index = load_name_index(db)
+        print(f"Loaded {len(name_index):,} drug names and synonyms in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    ctx = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+    processed = state["rows"]
+    done = 0
+    started = time.perf_counter()
+    last_report = started
+
+    with open(args.input, newline="", encoding="utf-8-sig") as source, open(output, "a+", newline="", encoding="utf-8") as sink:
+        sink.seek(state["offset"])
+        sink.truncate()
+        writer = csv.DictWriter(sink, fieldnames=OUTPUT_FIELDS) if fmt == "csv" else None
+        if writer is not None and state["offset"] == 0:
+            writer.writeheader()
+
+        rows = prescription_rows(source, default_contexts)
+        for _ in islice(rows, processed):
+            pass
+
+        with ctx.Pool(args.workers, initializer=init_worker, initargs=(db_path, snapshot_path, name_index)) as pool:
+            while True:
+                batch = list(islice(rows, args.batch_size))
+                if not batch:
+                    break
+                for results in pool.imap(audit_chunk, chunked(batch, args.chunk_size)):
+                    for result in results:
+                        if writer is not None:
+                            writer.writerow(csv_record(result))
+                        else:
+                            sink.write(json.dumps(result, ensure_ascii=False) + "\n")
+                processed += len(batch)
+                done += len(batch)
+                sink.flush()
+                save_checkpoint(checkpoint, processed, sink.tell())
+
+                now = time.perf_counter()
+                if now - last_report >= args.report_every:
+                    print(f"{processed:,} rows · {done / (now - started):,.0f} rows/sec", file=sys.stderr)
+                    last_report = now
+
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0.0
+    print(f"Audited {done:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec); {processed:,} rows total in {output}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Audit a prescription CSV offline with the NeuroPharmDB interaction and patient-risk logic.")
+    parser.add_argument("input", help="CSV with patient_id, medications and contexts columns")
+    parser.add_argument("output", help="Results file (.ndjson or .csv)")
+    parser.add_argument("--db", default=str(app.DB_PATH), help="DrugBank SQLite database")
+    parser.add_argument("--snapshot", help="Compiled snapshot (default: the database path with a .snapshot suffix, used when current)")
+    parser.add_argument("--format", choices=("ndjson", "csv"), help="Output format (default: from the output suffix)")
+    parser.add_argument("--contexts", default="all", help="Contexts used when a row has none (comma-separated, or 'all')")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows read into memory per batch")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Rows sent to a worker per task")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress lines")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import http.client
+import json
+import platform
+import queue
+import random
+import socket
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterator
+from urllib.parse import quote, urlparse
+
+import app
+from app import PATIENT_CONTEXT_RULES, SERVER_WORKERS, NeuroPharmHandler, start_asyncio_server
+
+
+SCENARIOS = ("search", "check-many", "ai-insights", "patient-risk", "similar", "drug-detail")
+SERVERS = ("threading", "asyncio")
+
+
+def drug_pool(db_path: Path, limit: int = 400, seed: int = 7) -> list[tuple[str, str]]:
+    with sqlite3.connect(db_path) as db:
+        rows = db.execute(
+            """
+            SELECT drugbank_id, name
+            FROM drugs
+            WHERE name IS NOT NULL AND TRIM(name) != ''
+            ORDER BY drugbank_id
+            """
+        ).fetchall()
+    rng = random.Random(seed)
+    return rng.sample(rows, min(limit, len(rows)))
+
+
+def scenario_paths(name: str, drugs: list[tuple[str, str]], count: int, seed: int = 11) -> list[str]:
+    rng = random.Random(seed)
+    contexts = ",".join(PATIENT_CONTEXT_RULES)
+    paths: list[str] = []
+    while len(paths) < count:
+        if name == "search":
+            word = rng.choice(drugs)[1]
+            paths.extend(f"/api/search?q={quote(word[:length])}" for length in range(2, min(len(word), 9) + 1))
+            continue
+        ids = ",".join(drug_id for drug_id, _ in rng.sample(drugs, rng.randint(2, 12)))
+        drug_id = rng.choice(drugs)[0]
+        paths.append(
+            {
+                "check-many": f"/api/check-many?ids={ids}",
+                "ai-insights": f"/api/ai-insights?ids={ids}",
+                "patient-risk": f"/api/patient-risk?ids={ids}&contexts={contexts}",
+                "similar": f"/api/similar?drug={drug_id}",
+                "drug-detail": f"/api/drugs/{drug_id}",
+            }[name]
+        )
+    return paths[:count]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_scenario(host: str, port: int, name: str, paths: list[str], concurrency: int) -> dict:
+    pending: queue.SimpleQueue[str] = queue.SimpleQueue()
+    for path in paths:
+        pending.put(path)
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker() -> None:
+        nonlocal errors
+        conn = http.client.HTTPConnection(host, port, timeout=120)
+        while True:
+            try:
+                path = pending.get_nowait()
+            except queue.Empty:
+                break
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                failed = response.status != 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=120)
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += failed
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "benchmark": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requestsPerSec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50Ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "maxMs": round(max(latencies, default=0.0) * 1000, 2),
+    }
+
+
+def prescription_csv(names: list[str], patients: int, seed: int = 7) -> Iterator[bytes]:
+    rng = random.Random(seed)
+    contexts = list(PATIENT_CONTEXT_RULES)
+    yield b"patient_id,medications,contexts\n"
+    for index in range(patients):
+        medications = ";".join(rng.sample(names, rng.randint(2, 8))).replace('"', "")
+        chosen = ";".join(rng.sample(contexts, rng.randint(0, 3)))
+        yield f'P{index:07d},"{medications}",{chosen}\n'.encode("utf-8")
+
+
+def regimen_lines(drugs: list[tuple[str, str]], regimens: int, seed: int = 13) -> Iterator[bytes]:
+    rng = random.Random(seed)
+    for _ in range(regimens):
+        yield (",".join(drug_id for drug_id, _ in rng.sample(drugs, rng.randint(2, 12))) + "\n").encode("ascii")
+
+
+def start_server(mode: str, workers: int) -> tuple[Callable[[], None], int]:
+    NeuroPharmHandler.log_message = lambda *args: None
+    if mode == "asyncio":
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(start_asyncio_server("127.0.0.1", 0, workers))
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+
+        async def shutdown() -> None:
+            server.close()
+            connections = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in connections:
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+
+        def stop() -> None:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+        return stop, server.sockets[0].getsockname()[1]
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NeuroPharmHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown, server.server_address[1]
+
+
+def open_idle_connections(host: str, port: int, count: int) -> list[socket.socket]:
+    """Browser-like keep-alive connections that made one request and went quiet."""
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection((host, port))
+        sock.sendall(b"GET /api/stats HTTP/1.1\r\nHost: benchmark\r\n\r\n")
+        sockets.append(sock)
+    for sock in sockets:
+        sock.recv(65536)
+    return sockets
+
+
+def resident_kib(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def watch_resident(pid: int, done: threading.Event, peak: list[int]) -> None:
+    while not done.wait(0.01):
+        peak[0] = max(peak[0], resident_kib(pid) or 0)
+
+
+def bench_audit_batch(host: str, port: int, names: list[str], patients: int, in_process: bool, server_pid: int | None = None) -> dict:
+    """Upload throughput. Memory is the Python heap peak when the server runs
+    in this process, and the server's sampled RSS peak when its pid is given;
+    the heap of a client talking to a remote server says nothing about it."""
+    if in_process:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    if server_pid is not None:
+        done, peak_rss = threading.Event(), [resident_kib(server_pid) or 0]
+        watcher = threading.Thread(target=watch_resident, args=(server_pid, done, peak_rss), daemon=True)
+        watcher.start()
+    started = time.perf_counter()
+    first_result = None
+    results = 0
+
+    conn = http.client.HTTPConnection(host, port)
+    conn.request(
+        "POST",
+        "/api/audit/batch",
+        body=prescription_csv(names, patients),
+        headers={"Content-Type": "text/csv"},
+        encode_chunked=True,
+    )
+    response = conn.getresponse()
+    for line in response:
+        if first_result is None:
+            first_result = time.perf_counter() - started
+        record = json.loads(line)
+        if "patient_id" in record:
+            results += 1
+        elif "error" in record:
+            raise RuntimeError(record["error"])
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    result = {
+        "benchmark": "audit-batch",
+        "patients": results,
+        "seconds": round(elapsed, 3),
+        "patientsPerSec": round(results / elapsed, 1) if elapsed else 0.0,
+        "firstResultMs": round((first_result or 0.0) * 1000, 1),
+    }
+    if in_process:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peakMemoryKiB"] = round(peak / 1024, 1)
+    if server_pid is not None:
+        done.set()
+        watcher.join()
+        result["serverPeakRssKiB"] = peak_rss[0]
+    return result
+
+
+def bench_risk_batch(host: str, port: int, drugs: list[tuple[str, str]], regimens: int) -> dict:
+    started = time.perf_counter()
+    first_result = None
+    results = 0
+
+    conn = http.client.HTTPConnection(host, port)
+    conn.request(
+        "POST",
+        "/api/patient-risk/batch?contexts=all",
+        body=regimen_lines(drugs, regimens),
+        headers={"Content-Type": "text/plain"},
+        encode_chunked=True,
+    )
+    response = conn.getresponse()
+    for line in response:
+        if first_result is None:
+            first_result = time.perf_counter() - started
+        record = json.loads(line)
+        if "line" in record:
+            results += 1
+        elif "error" in record:
+            raise RuntimeError(record["error"])
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "benchmark": "risk-batch",
+        "regimens": results,
+        "seconds": round(elapsed, 3),
+        "regimensPerSec": round(results / elapsed, 1) if elapsed else 0.0,
+        "firstResultMs": round((first_result or 0.0) * 1000, 1),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=app.ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def result_key(item: dict) -> tuple:
+    return item.get("server", "threading"), item["benchmark"], item.get("concurrency"), item.get("patients"), item.get("regimens")
+
+
+def compare(results: list[dict], previous_path: Path) -> None:
+    previous = {result_key(item): item for item in json.loads(previous_path.read_text())["results"]}
+    print(f"\nCompared with {previous_path}:")
+    for item in results:
+        before = previous.get(result_key(item))
+        if before is None:
+            continue
+        for metric in ("requestsPerSec", "patientsPerSec", "regimensPerSec", "p50Ms", "p99Ms", "peakMemoryKiB", "serverPeakRssKiB", "serverThreads"):
+            if metric in item and before.get(metric):
+                change = (item[metric] - before[metric]) / before[metric] * 100
+                print(f"  {item.get('server', 'threading'):<9} {item['benchmark']:<14} c={item.get('concurrency', '-')!s:<3} {metric:<15} {before[metric]:>10} -> {item[metric]:>10} ({change:+.1f}%)")
+
+
+def compare_servers(results: list[dict]) -> None:
+    by_key = {result_key(item): item for item in results}
+    print("\nasyncio vs threading:")
+    for (server, *rest), item in by_key.items():
+        before = by_key.get(("threading", *rest))
+        if server != "asyncio" or before is None:
+            continue
+        for metric in ("requestsPerSec", "patientsPerSec", "regimensPerSec", "p99Ms", "serverThreads"):
+            if metric in item and before.get(metric):
+                change = (item[metric] - before[metric]) / before[metric] * 100
+                print(f"  {item['benchmark']:<14} c={item.get('concurrency', '-')!s:<3} {metric:<15} {before[metric]:>10} -> {item[metric]:>10} ({change:+.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark NeuroPharmDB endpoints against a real or synthetic database.")
+    parser.add_argument("--db", help="SQLite database (default: drugbank_full.db, or a synthetic one with --scale)")
+    parser.add_argument("--scale", type=float, help="Generate a synthetic database at this scale instead of using --db")
+    parser.add_argument("--url", help="Benchmark an already running server instead of an in-process one")
+    parser.add_argument("--server-pid", type=int, help="With --url, the server's process id; its RSS is sampled from /proc during batch uploads")
+    parser.add_argument("--server", nargs="+", choices=SERVERS, default=["threading"], help="In-process server modes to run the scenarios against")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Worker threads for the asyncio server")
+    parser.add_argument("--idle", type=int, default=0, help="Idle keep-alive connections held open during each run")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--patients", type=int, nargs="*", default=[500, 5000], help="Upload sizes for /api/audit/batch")
+    parser.add_argument("--regimens", type=int, nargs="*", default=[1000, 20000], help="Upload sizes for /api/patient-risk/batch")
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier --out file to compare against")
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        from synthetic_db import generate
+
+        db_path = Path(args.db or Path(tempfile.gettempdir()) / f"neuropharm-synthetic-{args.scale:g}.db")
+        if not db_path.exists():
+            print(f"Generating synthetic database at scale {args.scale:g}: {db_path}")
+            generate(db_path, args.scale, seed=7)
+    else:
+        db_path = Path(args.db) if args.db else app.DB_PATH
+    if not db_path.exists():
+        raise SystemExit(f"Database not found: {db_path}")
+    app.DB_PATH = db_path
+
+    drugs = drug_pool(db_path)
+    names = [name for _, name in drugs]
+    results = []
+    for mode in [args.url] if args.url else args.server:
+        stop = None
+        if args.url:
+            target = urlparse(args.url)
+            host, port = target.hostname or "127.0.0.1", target.port or 80
+        else:
+            stop, port = start_server(mode, args.workers)
+            host = "127.0.0.1"
+
+        idle = open_idle_connections(host, port, args.idle)
+        try:
+            for name in args.scenarios:
+                paths = scenario_paths(name, drugs, args.requests)
+                for concurrency in args.concurrency:
+                    result = run_scenario(host, port, name, paths, concurrency)
+                    if not args.url:
+                        result = {"server": mode, **result, "serverThreads": threading.active_count()}
+                    results.append(result)
+                    print(json.dumps(result))
+            for patients in args.patients:
+                result = bench_audit_batch(host, port, names, patients, not args.url, args.server_pid)
+                if not args.url:
+                    result = {"server": mode, **result}
+                results.append(result)
+                print(json.dumps(result))
+            for regimens in args.regimens:
+                result = bench_risk_batch(host, port, drugs, regimens)
+                if not args.url:
+                    result = {"server": mode, **result}
+                results.append(result)
+                print(json.dumps(result))
+        finally:
+            for sock in idle:
+                sock.close()
+            if stop is not None:
+                stop()
+
+    report = {
+        "meta": {
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": str(db_path),
+            "scale": args.scale,
+            "server": args.url or f"in-process {', '.join(args.server)}",
+            "workers": args.workers,
+            "idleConnections": args.idle,
+            "requestsPerScenario": args.requests,
+        },
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2) + "\n")
+    if not args.url and len(args.server) > 1:
+        compare_servers(results)
+    if args.compare:
+        compare(results, Path(args.compare))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import app
+from app import METRICS, PATIENT_CONTEXT_RULES, NeuroPharmAPI, RiskScorer
+from benchmark import drug_pool, start_server
+
+
+def canonical(result: dict) -> str:
+    return json.dumps(result, sort_keys=True)
+
+
+def check_selections(api: NeuroPharmAPI, drugs: list[str], sessions: int, steps: int, seed: int) -> dict:
+    """Walk token-keyed sessions one added, removed or swapped drug at a time
+    and compare each response with the same request made without a token."""
+    rng = random.Random(seed)
+    contexts = list(PATIENT_CONTEXT_RULES)
+    compared = 0
+    mismatches: list[dict] = []
+    started = time.perf_counter()
+    for session in range(sessions):
+        token = f"consistency-{seed}-{session}"
+        ids = rng.sample(drugs, 2)
+        for step in range(steps):
+            raw_ids = ",".join(ids)
+            raw_contexts = ",".join(rng.sample(contexts, rng.randint(1, len(contexts))))
+            requests = {
+                "check-many": lambda selection: api.check_many(raw_ids, selection),
+                "ai-insights": lambda selection: api.ai_insights(raw_ids, selection),
+                "patient-risk": lambda selection: api.patient_risk(raw_ids, raw_contexts, selection),
+            }
+            for endpoint, request in requests.items():
+                # Each request looks its session up again, as the handler does.
+                if canonical(request(api.selection(token))) != canonical(request(None)):
+                    mismatches.append({"endpoint": endpoint, "session": session, "step": step, "ids": raw_ids})
+                compared += 1
+
+            move = rng.random()
+            if len(ids) < 12 and (move < 0.5 or len(ids) == 2):
+                ids.append(rng.choice([drug_id for drug_id in drugs if drug_id not in ids]))
+            elif move < 0.8:
+                ids.pop(rng.randrange(len(ids)))
+            else:
+                ids[rng.randrange(len(ids))] = rng.choice([drug_id for drug_id in drugs if drug_id not in ids])
+    return {"check": "selections", "compared": compared, "mismatches": mismatches, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def check_pairs(api: NeuroPharmAPI, drugs: list[str], pairs: int, seed: int) -> dict:
+    """Compare /api/check, both ways round, with check-many's pair for pairs
+    listed more than once, where the row chosen by PAIR_ORDER matters, and for
+    random pairs."""
+    rng = random.Random(seed)
+    with api.connect() as db:
+        duplicated = db.execute(
+            """
+            SELECT MIN(drug1_id, drug2_id), MAX(drug1_id, drug2_id)
+            FROM drug_interactions
+            WHERE drug1_id != drug2_id
+            GROUP BY 1, 2
+            HAVING COUNT(*) > 1
+            LIMIT ?
+            """,
+            (pairs,),
+        ).fetchall()
+    candidates = [tuple(row) for row in duplicated] + [tuple(rng.sample(drugs, 2)) for _ in range(pairs)]
+    started = time.perf_counter()
+    mismatches = []
+    for first, second in candidates:
+        many = api.check_many(f"{first},{second}")
+        if many.get("error"):
+            continue
+        expected = many["pairs"][0]
+        for drug1, drug2 in ((first, second), (second, first)):
+            single = api.check_pair(drug1, drug2)
+            if single["found"] != expected["found"] or single.get("interaction") != expected.get("interaction"):
+                mismatches.append({"drug1": drug1, "drug2": drug2})
+    return {
+        "check": "pair checks",
+        "compared": len(candidates),
+        "duplicated": len(duplicated),
+        "mismatches": mismatches,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def risk_summary(result: dict) -> dict:
+    """patient_risk's response without the evidence, as the batch scorer reports it."""
+    if "error" in result:
+        return {"error": result["error"]}
+    fields = ("id", "label", "score", "level", "signalCount")
+    return {"overall": result["overall"], "contexts": [{field: context[field] for field in fields} for context in result["contexts"]]}
+
+
+def check_risk_batch(api: NeuroPharmAPI, drugs: list[str], regimens: int, seed: int) -> dict:
+    """Score regimens through the batch path and compare each with
+    patient_risk for the same drugs and contexts."""
+    rng = random.Random(seed)
+    contexts = rng.sample(list(PATIENT_CONTEXT_RULES), 4)
+    lines = []
+    for number in range(1, regimens + 1):
+        ids = rng.sample(drugs, rng.randint(1, 12))
+        if number % 97 == 0:
+            ids.append("DB99999")
+        if number % 89 == 0:
+            ids.append(ids[0])
+        lines.append((number, ",".join(ids)))
+
+    started = time.perf_counter()
+    batch = list(api.risk_batch(iter(lines), contexts))
+    seconds = time.perf_counter() - started
+    mismatches = []
+    for (number, raw_ids), result in zip(lines, batch, strict=True):
+        scored = {key: value for key, value in result.items() if key not in ("line", "ids")}
+        if result["line"] != number or scored != risk_summary(api.patient_risk(raw_ids, ",".join(contexts))):
+            mismatches.append({"line": number, "ids": raw_ids})
+    return {"check": "risk batch", "compared": len(lines), "mismatches": mismatches, "seconds": round(seconds, 2)}
+
+
+def check_pair_labels(api: NeuroPharmAPI, drugs: list[str], seed: int) -> dict:
+    """Probe pairs through RiskScorer in chunks of different sizes; the
+    statement must stay one /api/metrics series."""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    for size in (3, 40):
+        pairs = list({frozenset(rng.sample(drugs, 2)) for _ in range(size)})
+        RiskScorer(api).load_pairs(pairs)
+    with METRICS.lock:
+        labels = [statement for statement in METRICS.queries if statement.startswith("WITH wanted")]
+    mismatches = [{"labels": labels}] if len(labels) != 1 else []
+    return {"check": "pair query labels", "compared": 2, "mismatches": mismatches, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def check_profiling(api: NeuroPharmAPI, drugs: list[str], requests: int, seed: int) -> dict:
+    """Send sampled requests at once through the server and compare each
+    response with the unprofiled result; profiling never changes a reply."""
+    rng = random.Random(seed)
+    paths = [f"/api/ai-insights?ids={','.join(rng.sample(drugs, 12))}" for _ in range(requests)]
+    replies: list[tuple[int, bool, str] | str] = [""] * requests
+    barrier = threading.Barrier(requests)
+    sample_rate, profile_dir = app.PROFILE_SAMPLE_RATE, app.PROFILE_DIR
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        app.PROFILE_SAMPLE_RATE, app.PROFILE_DIR = 1.0, Path(directory)
+        stop, port = start_server("threading", requests)
+        try:
+
+            def send(index: int) -> None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                barrier.wait()
+                try:
+                    conn.request("GET", paths[index])
+                    response = conn.getresponse()
+                    replies[index] = (response.status, bool(response.getheader("X-Profile-Id")), response.read().decode("utf-8"))
+                except (OSError, http.client.HTTPException) as exc:
+                    replies[index] = f"{type(exc).__name__}: {exc}"
+                finally:
+                    conn.close()
+
+            threads = [threading.Thread(target=send, args=(index,)) for index in range(requests)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            stop()
+            app.PROFILE_SAMPLE_RATE, app.PROFILE_DIR = sample_rate, profile_dir
+        written = len(list(Path(directory).glob("*.pstats")))
+
+    mismatches = []
+    for path, reply in zip(paths, replies, strict=True):
+        expected = canonical(api.ai_insights(path.split("ids=", 1)[1]))
+        if isinstance(reply, str) or reply[0] != 200 or canonical(json.loads(reply[2])) != expected:
+            mismatches.append({"path": path, "reply": reply if isinstance(reply, str) else reply[0]})
+    profiled = sum(1 for reply in replies if not isinstance(reply, str) and reply[1])
+    if not profiled or profiled != written:
+        mismatches.append({"profiled": profiled, "written": written})
+    return {"check": "concurrent profiling", "compared": requests, "profiled": profiled, "mismatches": mismatches, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the incremental and cached paths with a full recompute on the same database.")
+    parser.add_argument("--db", help="SQLite database (default: drugbank_full.db, or a synthetic one with --scale)")
+    parser.add_argument("--scale", type=float, help="Generate a synthetic database at this scale instead of using --db")
+    parser.add_argument("--snapshot", help="Compiled snapshot to read from (default: <db>.snapshot when current)")
+    parser.add_argument("--sessions", type=int, default=20, help="Token-keyed sessions to walk")
+    parser.add_argument("--steps", type=int, default=15, help="Selection changes per session")
+    parser.add_argument("--pairs", type=int, default=300, help="Pairs compared between /api/check and check-many")
+    parser.add_argument("--regimens", type=int, default=2000, help="Regimens scored through the batch path")
+    parser.add_argument("--profiled", type=int, default=6, help="Sampled requests sent at once to the profiler")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        from synthetic_db import generate
+
+        db_path = Path(args.db or Path(tempfile.gettempdir()) / f"neuropharm-synthetic-{args.scale:g}.db")
+        if not db_path.exists():
+            print(f"Generating synthetic database at scale {args.scale:g}: {db_path}")
+            generate(db_path, args.scale, seed=7)
+    else:
+        db_path = Path(args.db) if args.db else app.DB_PATH
+    if not db_path.exists():
+        raise SystemExit(f"Database not found: {db_path}")
+    app.DB_PATH = db_path
+    app.SNAPSHOT_PATH = Path(args.snapshot) if args.snapshot else db_path.with_suffix(".snapshot")
+
+    api = NeuroPharmAPI()
+    print(f"Reading {db_path}" + (f" and {app.SNAPSHOT_PATH}" if api.snapshot() is not None else ""))
+    drugs = [drug_id for drug_id, _ in drug_pool(db_path)]
+    results = [
+        check_selections(api, drugs, args.sessions, args.steps, args.seed),
+        check_pairs(api, drugs, args.pairs, args.seed),
+        check_risk_batch(api, drugs, args.regimens, args.seed),
+        check_pair_labels(api, drugs, args.seed),
+        check_profiling(api, drugs, args.profiled, args.seed),
+    ]
+
+    failed = False
+    for result in results:
+        print(json.dumps({**result, "mismatches": len(result["mismatches"])}))
+        for mismatch in result["mismatches"][:5]:
+            print(f"  differs: {json.dumps(mismatch)}")
+        failed = failed or bool(result["mismatches"])
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
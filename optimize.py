@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import app
+from app import REQUIRED_INDEXES, full_scans, missing_indexes
+
+
+PAGE_SIZES = (1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+
+def create_indexes(db: sqlite3.Connection) -> None:
+    for name in missing_indexes(db):
+        started = time.perf_counter()
+        db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {REQUIRED_INDEXES[name]}")
+        db.commit()
+        print(f"Created {name} on {REQUIRED_INDEXES[name]} in {time.perf_counter() - started:.1f}s")
+
+
+def run(args: argparse.Namespace) -> None:
+    db_path = Path(args.db)
+    if not db_path.exists():
+        raise SystemExit(f"Database not found: {db_path}")
+
+    db = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        before = full_scans(db)
+        if args.check:
+            for name, details in before.items():
+                print(f"{name}: {'; '.join(details)}")
+            print(f"{len(before)} of {len(app.CANNED_QUERIES)} API queries scan whole tables; missing indexes: {', '.join(missing_indexes(db)) or 'none'}")
+            raise SystemExit(1 if before else 0)
+
+        create_indexes(db)
+
+        started = time.perf_counter()
+        db.execute("ANALYZE")
+        db.execute("PRAGMA optimize")
+        print(f"Analyzed in {time.perf_counter() - started:.1f}s")
+
+        if args.vacuum:
+            size = db_path.stat().st_size
+            started = time.perf_counter()
+            if db.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+                db.execute("PRAGMA journal_mode = DELETE")
+            db.execute(f"PRAGMA page_size = {args.page_size}")
+            db.execute("VACUUM")
+            print(
+                f"Vacuumed with {db.execute('PRAGMA page_size').fetchone()[0]}-byte pages in {time.perf_counter() - started:.1f}s: "
+                f"{size / 1_048_576:,.1f} MiB -> {db_path.stat().st_size / 1_048_576:,.1f} MiB"
+            )
+
+        after = full_scans(db)
+    finally:
+        db.close()
+
+    print(f"Full table scans in API queries: {len(before)} before, {len(after)} after")
+    for name, details in after.items():
+        print(f"  still scanning: {name}: {'; '.join(details)}", file=sys.stderr)
+    if Path(args.db).with_suffix(".snapshot").exists():
+        print("The database changed; run `python3 snapshot.py` to recompile the snapshot.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Create the indexes NeuroPharmDB queries need, refresh planner statistics and optionally VACUUM.")
+    parser.add_argument("--db", default=str(app.DB_PATH), help="DrugBank SQLite database")
+    parser.add_argument("--check", action="store_true", help="Only report queries that scan whole tables (exit status 1 if any)")
+    parser.add_argument("--vacuum", action="store_true", help="Rebuild the file after indexing")
+    parser.add_argument("--page-size", type=int, choices=PAGE_SIZES, default=8192, help="Page size used by --vacuum")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import app
+from app import PAIR_ORDER, database_stamp, refresh_manifest_path
+from optimize import create_indexes
+from snapshot import compile_snapshot
+
+
+# Every table is replaced per drug: the key column groups the rows one drug owns.
+TABLE_KEYS = {
+    "drugs": "drugbank_id",
+    "synonyms": "drug_id",
+    "drug_interactions": "drug1_id",
+    "food_interactions": "drug_id",
+    "categories": "drug_id",
+    "targets": "drug_id",
+    "enzymes": "drug_id",
+    "carriers": "drug_id",
+    "transporters": "drug_id",
+    "products": "drug_id",
+    "dosages": "drug_id",
+}
+
+# Tables whose rows feed the name/synonym index.
+NAME_TABLES = ("drugs", "synonyms")
+
+
+def columns(db: sqlite3.Connection, schema: str, table: str) -> list[str]:
+    return [row[1] for row in db.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def digests(db: sqlite3.Connection, schema: str, table: str, key: str) -> tuple[dict[str, bytes], int]:
+    hashes: dict[str, hashlib.blake2b] = {}
+    rows = 0
+    for row in db.execute(f"SELECT {key}, * FROM {schema}.{table} ORDER BY rowid"):
+        digest = hashes.get(row[0])
+        if digest is None:
+            digest = hashes[row[0]] = hashlib.blake2b(digest_size=16)
+        digest.update(repr(row[1:]).encode("utf-8"))
+        rows += 1
+    return {drug_id: digest.digest() for drug_id, digest in hashes.items()}, rows
+
+
+def apply_release(db: sqlite3.Connection) -> dict[str, dict]:
+    report: dict[str, dict] = {}
+    for table, key in TABLE_KEYS.items():
+        current = columns(db, "main", table)
+        if current != columns(db, "release", table):
+            raise SystemExit(f"{table} columns differ between the database and the release; run a full import instead")
+
+        started = time.perf_counter()
+        old, _ = digests(db, "main", table, key)
+        new, scanned = digests(db, "release", table, key)
+        changed = sorted(drug_id for drug_id in old.keys() | new.keys() if old.get(drug_id) != new.get(drug_id))
+
+        db.execute("DELETE FROM temp.changed")
+        db.executemany("INSERT INTO temp.changed VALUES (?)", ((drug_id,) for drug_id in changed))
+        deleted = db.execute(f"DELETE FROM main.{table} WHERE {key} IN (SELECT drug_id FROM temp.changed)").rowcount
+        names = ", ".join(current)
+        inserted = db.execute(
+            f"""
+            INSERT INTO main.{table} ({names})
+            SELECT {names} FROM release.{table}
+            WHERE {key} IN (SELECT drug_id FROM temp.changed)
+            ORDER BY rowid
+            """
+        ).rowcount
+        report[table] = {
+            "scanned": scanned,
+            "changedKeys": changed,
+            "added": len(new.keys() - old.keys()),
+            "removed": len(old.keys() - new.keys()),
+            "deletedRows": deleted,
+            "insertedRows": inserted,
+            "seconds": time.perf_counter() - started,
+        }
+        print(
+            f"{table:<18} {scanned:>10,} rows scanned · {len(changed):>6,} drugs changed "
+            f"(+{report[table]['added']:,} / -{report[table]['removed']:,}) · "
+            f"{deleted:,} rows replaced by {inserted:,} in {report[table]['seconds']:.1f}s"
+        )
+    return report
+
+
+def chosen_pairs(db: sqlite3.Connection, schema: str) -> dict[frozenset[str], str]:
+    chosen: dict[frozenset[str], str] = {}
+    for drug1_id, drug2_id, description in db.execute(
+        f"SELECT drug1_id, drug2_id, description FROM {schema}.drug_interactions ORDER BY {PAIR_ORDER}"
+    ):
+        chosen.setdefault(frozenset((drug1_id, drug2_id)), description)
+    return chosen
+
+
+def verify_release(db: sqlite3.Connection) -> list[str]:
+    """Where the refreshed database would answer differently from a full
+    import of the release: per-drug rows in each table, and the description
+    chosen for each pair."""
+    problems = []
+    for table, key in TABLE_KEYS.items():
+        if digests(db, "main", table, key) != digests(db, "release", table, key):
+            problems.append(f"{table} rows differ")
+    refreshed, release = chosen_pairs(db, "main"), chosen_pairs(db, "release")
+    differing = sum(1 for pair in refreshed.keys() | release.keys() if refreshed.get(pair) != release.get(pair))
+    if differing:
+        problems.append(f"{differing:,} pairs show a different interaction")
+    return problems
+
+
+def run(args: argparse.Namespace) -> None:
+    db_path, release_path = Path(args.db), Path(args.release)
+    for path in (db_path, release_path):
+        if not path.exists():
+            raise SystemExit(f"Database not found: {path}")
+    staged = Path(args.output or db_path.with_name(f"{db_path.name}.next"))
+    snapshot_path = Path(args.snapshot or db_path.with_suffix(".snapshot"))
+    started = time.perf_counter()
+
+    # Copy the live file first so untouched rows keep their rowids and pages.
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as source, sqlite3.connect(staged) as target:
+        source.backup(target)
+    print(f"Copied {db_path.name} in {time.perf_counter() - started:.1f}s")
+
+    db = sqlite3.connect(f"file:{staged}", uri=True, isolation_level=None)
+    try:
+        db.execute("ATTACH DATABASE ? AS release", (f"file:{release_path}?mode=ro",))
+        db.execute("CREATE TEMP TABLE changed (drug_id TEXT PRIMARY KEY)")
+        db.execute("BEGIN")
+        report = apply_release(db)
+        db.execute("COMMIT")
+        if args.verify:
+            verify_started = time.perf_counter()
+            problems = verify_release(db)
+            if problems:
+                raise SystemExit(f"{staged} differs from a full import of {release_path.name}: {'; '.join(problems)}; nothing swapped")
+            print(f"Verified against {release_path.name} in {time.perf_counter() - verify_started:.1f}s")
+        db.execute("DETACH DATABASE release")
+
+        rebuilt_started = time.perf_counter()
+        create_indexes(db)
+        db.execute("PRAGMA optimize")
+        rebuilt = ["planner statistics (PRAGMA optimize)"]
+    finally:
+        db.close()
+
+    changed = sorted({drug_id for table in report.values() for drug_id in table["changedKeys"]})
+    names_changed = any(report[table]["changedKeys"] for table in NAME_TABLES)
+    if changed and snapshot_path.exists() and not args.no_snapshot:
+        staged_snapshot = snapshot_path.with_name(f"{snapshot_path.name}.next")
+        compile_snapshot(staged, staged_snapshot)
+        rebuilt.append(f"snapshot {snapshot_path.name}")
+    else:
+        staged_snapshot = None
+    rebuild_seconds = time.perf_counter() - rebuilt_started
+
+    if not changed:
+        staged.unlink()
+        print(f"No changes between {db_path.name} and {release_path.name}; nothing swapped")
+        return
+
+    # The manifest names the new stamp, so the server drops only caches that
+    # involve changed drugs. The snapshot goes first: a running server keeps
+    # its old mapping until it sees the database stamp change.
+    manifest = {
+        "stamp": list(database_stamp(staged)),
+        "release": release_path.name,
+        "changedDrugs": changed,
+        "namesChanged": names_changed,
+    }
+    manifest_path = refresh_manifest_path(db_path)
+    manifest_path.with_suffix(".tmp").write_text(json.dumps(manifest))
+    os.replace(manifest_path.with_suffix(".tmp"), manifest_path)
+    if staged_snapshot is not None:
+        os.replace(staged_snapshot, snapshot_path)
+    if args.keep_previous:
+        previous = db_path.with_name(f"{db_path.name}.previous")
+        previous.unlink(missing_ok=True)
+        os.link(db_path, previous)
+    os.replace(staged, db_path)
+
+    elapsed = time.perf_counter() - started
+    scanned = sum(table["scanned"] for table in report.values())
+    written = sum(table["deletedRows"] + table["insertedRows"] for table in report.values())
+    print(
+        f"Swapped {db_path.name} in {elapsed:.1f}s: {len(changed):,} drugs changed, "
+        f"{scanned / elapsed:,.0f} release rows/sec scanned, {written:,} rows written"
+    )
+    print(f"Rebuilt in {rebuild_seconds:.1f}s: {', '.join(rebuilt)}")
+    if names_changed:
+        print("Names or synonyms changed; running servers reload the name index")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply a new DrugBank release to the database as a per-drug diff and swap it in atomically.")
+    parser.add_argument("release", help="SQLite export of the new DrugBank release (same schema)")
+    parser.add_argument("--db", default=str(app.DB_PATH), help="Database the server is running on")
+    parser.add_argument("--output", help="Staging file for the refreshed database (default: <db>.next)")
+    parser.add_argument("--snapshot", help="Compiled snapshot to rebuild when present (default: <db>.snapshot)")
+    parser.add_argument("--no-snapshot", action="store_true", help="Do not rebuild the snapshot; servers fall back to SQLite")
+    parser.add_argument("--verify", action="store_true", help="Check the result matches a full import of the release before swapping")
+    parser.add_argument("--keep-previous", action="store_true", help="Keep the replaced file as <db>.previous")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
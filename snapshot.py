@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from array import array
+from pathlib import Path
+
+import app
+from app import (
+    PAIR_ORDER,
+    PATIENT_FIELDS,
+    PROFILE_FIELDS,
+    SEVERITIES,
+    SNAPSHOT_DRUG_COLUMNS,
+    SNAPSHOT_HEADER,
+    SNAPSHOT_MAGIC,
+    SNAPSHOT_NULL,
+    SNAPSHOT_SECTION,
+    SNAPSHOT_VERSION,
+    Snapshot,
+    SnapshotError,
+    clean_text,
+    database_stamp,
+    load_name_index,
+    row_to_drug,
+    severity_for,
+)
+
+
+class StringTable:
+    """Interned UTF-8 strings addressed by id; equal strings share one id."""
+
+    def __init__(self) -> None:
+        self.ids: dict[str, int] = {}
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+
+    def add(self, text: str | None) -> int:
+        if text is None:
+            return SNAPSHOT_NULL
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.offsets) - 1
+            self.data += text.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return string_id
+
+
+def csr(lists: list[list[int]]) -> tuple[array, array]:
+    offsets = array("Q", [0])
+    values = array("I")
+    for items in lists:
+        values.extend(items)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def compile_snapshot(db_path: Path, output: Path) -> dict:
+    if sys.byteorder != "little":
+        raise SnapshotError("compiled snapshots are little-endian only")
+    stamp = database_stamp(db_path)
+    strings = StringTable()
+    timings: dict[str, float] = {}
+
+    started = time.perf_counter()
+    db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    db.row_factory = sqlite3.Row
+
+    rows = sorted(db.execute("SELECT * FROM drugs"), key=lambda row: row["drugbank_id"].encode("utf-8"))
+    drug_indexes = {row["drugbank_id"]: index for index, row in enumerate(rows)}
+    drugs = array("I")
+    for row in rows:
+        profile = row_to_drug(row)
+        drugs.append(strings.add(row["drugbank_id"]))
+        drugs.append(strings.add(row["name"]))
+        drugs.extend(strings.add(profile[field]) for field in PROFILE_FIELDS)
+        drugs.extend(strings.add(clean_text(row[field])) for field in PATIENT_FIELDS)
+    assert len(drugs) == len(rows) * len(SNAPSHOT_DRUG_COLUMNS)
+    timings["drugs"] = time.perf_counter() - started
+
+    # The first row per unordered pair by PAIR_ORDER wins, as in load_selection.
+    started = time.perf_counter()
+    interactions = array("I")
+    pair_records: dict[tuple[int, int], int] = {}
+    neighbours: list[list[tuple[int, int]]] = [[] for _ in rows]
+    for row in db.execute(f"SELECT drug1_id, drug2_id, description FROM drug_interactions ORDER BY {PAIR_ORDER}"):
+        first, second = drug_indexes.get(row["drug1_id"]), drug_indexes.get(row["drug2_id"])
+        if first is None or second is None or first == second:
+            continue
+        pair = (first, second) if first < second else (second, first)
+        if pair in pair_records:
+            continue
+        record = pair_records[pair] = len(interactions) // 4
+        level, _ = severity_for(row["description"])
+        interactions.extend((first, second, strings.add(clean_text(row["description"])), SEVERITIES.index(level)))
+        neighbours[first].append((second, record))
+        neighbours[second].append((first, record))
+    adjacency_offsets = array("Q", [0])
+    adjacency_drugs = array("I")
+    adjacency_interactions = array("I")
+    for items in neighbours:
+        items.sort()
+        adjacency_drugs.extend(other for other, _ in items)
+        adjacency_interactions.extend(record for _, record in items)
+        adjacency_offsets.append(len(adjacency_drugs))
+    del pair_records, neighbours
+    timings["interactions"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    food: list[list[int]] = [[] for _ in rows]
+    for row in db.execute("SELECT drug_id, description FROM food_interactions ORDER BY rowid"):
+        index = drug_indexes.get(row["drug_id"])
+        if index is not None:
+            food[index].append(strings.add(clean_text(row["description"])))
+    food_offsets, food_texts = csr(food)
+    timings["food"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    names = sorted(load_name_index(db).items(), key=lambda item: item[0].encode("utf-8"))
+    name_keys = array("I", (strings.add(key) for key, _ in names))
+    name_values = array("I", (strings.add(value) for _, value in names))
+    timings["names"] = time.perf_counter() - started
+    db.close()
+
+    counts = {
+        "drugs": len(rows),
+        "interactions": len(interactions) // 4,
+        "foodInteractions": len(food_texts),
+        "names": len(names),
+        "strings": len(strings.offsets) - 1,
+    }
+    meta = {
+        "formatVersion": SNAPSHOT_VERSION,
+        "source": db_path.name,
+        "compiledAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "drugColumns": list(SNAPSHOT_DRUG_COLUMNS),
+        "counts": counts,
+    }
+    sections = {
+        "META": json.dumps(meta).encode("utf-8"),
+        "STRDATA": strings.data,
+        "STROFFS": strings.offsets,
+        "DRUGS": drugs,
+        "ADJOFFS": adjacency_offsets,
+        "ADJDRUG": adjacency_drugs,
+        "ADJIXN": adjacency_interactions,
+        "IXNS": interactions,
+        "FOODOFFS": food_offsets,
+        "FOOD": food_texts,
+        "NAMEKEYS": name_keys,
+        "NAMEVALS": name_values,
+    }
+
+    started = time.perf_counter()
+    tmp = output.with_suffix(output.suffix + ".tmp")
+    with open(tmp, "wb") as handle:
+        table_size = SNAPSHOT_HEADER.size + len(sections) * SNAPSHOT_SECTION.size
+        handle.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sections), *stamp))
+        handle.write(b"\0" * (table_size - SNAPSHOT_HEADER.size))
+        entries = []
+        for name, payload in sections.items():
+            handle.write(b"\0" * (-handle.tell() % 8))
+            offset = handle.tell()
+            data = memoryview(payload).cast("B")
+            handle.write(data)
+            entries.append(SNAPSHOT_SECTION.pack(name.encode("ascii"), offset, len(data)))
+        handle.seek(SNAPSHOT_HEADER.size)
+        handle.write(b"".join(entries))
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp, output)
+    timings["write"] = time.perf_counter() - started
+
+    return {"output": str(output), "bytes": output.stat().st_size, "counts": counts, "timings": timings}
+
+
+def describe(path: Path, db_path: Path) -> None:
+    snapshot = Snapshot(path)
+    try:
+        current = db_path.exists() and snapshot.source_stamp == database_stamp(db_path)
+        print(json.dumps({**snapshot.meta, "bytes": path.stat().st_size, "current": current}, indent=2))
+    finally:
+        snapshot.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile the DrugBank SQLite database into a read-only snapshot the server memory-maps.")
+    parser.add_argument("--db", default=str(app.DB_PATH), help="DrugBank SQLite database")
+    parser.add_argument("--output", default=str(app.SNAPSHOT_PATH), help="Snapshot file to write")
+    parser.add_argument("--info", action="store_true", help="Describe an existing snapshot instead of compiling")
+    args = parser.parse_args()
+
+    db_path, output = Path(args.db), Path(args.output)
+    if args.info:
+        describe(output, db_path)
+        return
+    if not db_path.exists():
+        raise SystemExit(f"Database not found: {db_path}")
+
+    result = compile_snapshot(db_path, output)
+    counts = result["counts"]
+    timings = " · ".join(f"{name} {seconds:.1f}s" for name, seconds in result["timings"].items())
+    print(
+        f"Wrote {output} ({result['bytes'] / 1_048_576:,.1f} MiB): {counts['drugs']:,} drugs, "
+        f"{counts['interactions']:,} interaction pairs, {counts['names']:,} names in {timings}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ const state = {
   lastInsights: null,
   patientContexts: new Set(),
   lastPatientRisk: null,
+  auditStream: null,
+  selectionToken: window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`,
 };
 
 const els = {
@@ -137,14 +139,186 @@ function showReaderModal(item) {
   document.body.appendChild(modal);
 }
 
-async function api(path) {
-  const response = await fetch(path);
-  if (!response.ok) throw new Error(`Request failed: ${response.status}`);
-  return response.json();
+// Every API response is a pure function of the database file, so responses are
+// kept in a memory LRU (and IndexedDB when available) under the server's
+// database version. A refresh on the server changes the version and the
+// caches start over.
+const cache = {
+  version: "",
+  limit: 400,
+  memory: new Map(),
+  inflight: new Map(),
+  slots: {},
+  store: null,
+};
+
+function cacheKey(path) {
+  const url = new URL(path, window.location.origin);
+  url.searchParams.delete("selection");
+  return `${url.pathname}?${url.searchParams}`;
+}
+
+function recall(key) {
+  const data = cache.memory.get(key);
+  if (data === undefined) return undefined;
+  cache.memory.delete(key);
+  cache.memory.set(key, data);
+  return data;
+}
+
+function remember(key, data, persist = true) {
+  cache.memory.delete(key);
+  cache.memory.set(key, data);
+  while (cache.memory.size > cache.limit) cache.memory.delete(cache.memory.keys().next().value);
+  if (persist) storeRequest("readwrite", (store) => store.put({ key: `${cache.version}|${key}`, data }));
+}
+
+function openCacheStore() {
+  if (!window.indexedDB) return Promise.resolve(null);
+  return new Promise((resolve) => {
+    const request = indexedDB.open("neuropharm-cache", 1);
+    request.onupgradeneeded = () => request.result.createObjectStore("responses", { keyPath: "key" });
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => resolve(null);
+    request.onblocked = () => resolve(null);
+  });
+}
+
+async function storeRequest(mode, operation) {
+  if (!cache.version) return undefined;
+  cache.store ||= openCacheStore();
+  const db = await cache.store;
+  if (!db) return undefined;
+  return new Promise((resolve) => {
+    try {
+      const request = operation(db.transaction("responses", mode).objectStore("responses"));
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => resolve(undefined);
+    } catch {
+      resolve(undefined);
+    }
+  });
+}
+
+function setDatabaseVersion(version) {
+  if (!version || version === cache.version) return;
+  const previous = cache.version;
+  cache.version = version;
+  if (previous) cache.memory.clear();
+  storeRequest("readwrite", (store) => store.delete(IDBKeyRange.upperBound(`${version}|`, true)));
+  storeRequest("readwrite", (store) => store.delete(IDBKeyRange.lowerBound(`${version}|\uffff`, true)));
+}
+
+function superseded(slot, ticket) {
+  return Boolean(slot) && cache.slots[slot]?.ticket !== ticket;
+}
+
+function claimSlot(slot) {
+  if (!slot) return { ticket: 0, signal: undefined };
+  const previous = cache.slots[slot];
+  previous?.controller?.abort();
+  const ticket = (previous?.ticket || 0) + 1;
+  cache.slots[slot] = { ticket, controller: new AbortController() };
+  return { ticket, signal: cache.slots[slot].controller.signal };
+}
+
+// `slot` names a part of the page that shows one answer at a time: a newer
+// request aborts the older one, which then resolves to null.
+async function api(path, { slot = "", cached = true } = {}) {
+  const key = cacheKey(path);
+  const { ticket, signal } = claimSlot(slot);
+  if (cached) {
+    const hit = recall(key) ?? (await storeRequest("readonly", (store) => store.get(`${cache.version}|${key}`)))?.data;
+    if (superseded(slot, ticket)) return null;
+    if (hit !== undefined) {
+      remember(key, hit, false);
+      return hit;
+    }
+  }
+
+  let pending = !slot && cache.inflight.get(key);
+  if (!pending) {
+    pending = fetch(path, { signal }).then(async (response) => {
+      if (!response.ok) throw new Error(`Request failed: ${response.status}`);
+      setDatabaseVersion(response.headers.get("X-Database-Version"));
+      const data = await response.json();
+      if (cached && response.ok && !data.error) remember(key, data);
+      return data;
+    });
+    if (!slot) {
+      cache.inflight.set(key, pending);
+      pending.finally(() => cache.inflight.delete(key)).catch(() => {});
+    }
+  }
+  try {
+    const data = await pending;
+    return superseded(slot, ticket) ? null : data;
+  } catch (error) {
+    if (error.name === "AbortError" || superseded(slot, ticket)) return null;
+    throw error;
+  }
+}
+
+function searchText(text) {
+  return String(text || "").replace(/[A-Z]/g, (letter) => letter.toLowerCase());
+}
+
+// A complete result list for "war" holds every match for "warf", so longer
+// queries are answered by filtering it the way the server's LIKE query ranks.
+function filterSearch(data, query) {
+  const q = searchText(query);
+  const ranked = [];
+  for (const drug of data.results) {
+    const name = searchText(drug.name);
+    const synonyms = (drug.synonyms || []).filter((synonym) => searchText(synonym).includes(q));
+    const rank = name.startsWith(q) ? 0 : name.includes(q) ? 1 : synonyms.length ? 2 : -1;
+    if (rank >= 0) ranked.push({ rank, drug: { ...drug, synonym: rank === 2 ? synonyms[0] : null, synonyms } });
+  }
+  ranked.sort((a, b) =>
+    a.rank - b.rank
+    || [...a.drug.name].length - [...b.drug.name].length
+    || (a.drug.name < b.drug.name ? -1 : a.drug.name > b.drug.name ? 1 : 0));
+  return { results: ranked.map((item) => item.drug), complete: true };
+}
+
+async function searchApi(query, slot) {
+  const q = query.trim().split(/\s+/).join(" ");
+  const path = `/api/search?q=${encodeURIComponent(q)}`;
+  const chars = [...q];
+  if (!recall(cacheKey(path)) && !/[%_]/.test(q)) {
+    for (let end = chars.length - 1; end >= 2; end -= 1) {
+      const base = recall(cacheKey(`/api/search?q=${encodeURIComponent(chars.slice(0, end).join(""))}`));
+      if (base?.complete) {
+        remember(cacheKey(path), filterSearch(base, q), false);
+        break;
+      }
+    }
+  }
+  return api(path, { slot });
+}
+
+// Profiles the page is about to show are fetched in one request and seeded
+// into the cache under their single-drug paths.
+async function prefetchProfiles(ids) {
+  const paths = new Map(ids.map((id) => [id, `/api/drugs/${encodeURIComponent(id)}`]));
+  const missing = [];
+  for (const [id, path] of paths) {
+    const key = cacheKey(path);
+    if (recall(key) !== undefined) continue;
+    const stored = (await storeRequest("readonly", (store) => store.get(`${cache.version}|${key}`)))?.data;
+    if (stored !== undefined) remember(key, stored, false);
+    else missing.push(id);
+  }
+  if (!missing.length) return;
+  const data = await api(`/api/drugs?ids=${encodeURIComponent(missing.join(","))}`, { cached: false });
+  Object.entries(data?.drugs || {}).forEach(([id, detail]) => {
+    if (!detail.error) remember(cacheKey(paths.get(id)), detail);
+  });
 }
 
 async function loadStats() {
-  const stats = await api("/api/stats");
+  const stats = await api("/api/stats", { cached: false });
+  setDatabaseVersion(stats.version);
   els.drugCount.textContent = fmt.format(stats.drugs);
   els.interactionCount.textContent = fmt.format(stats.interactions);
 }
@@ -240,7 +414,8 @@ function clearSuggestions(picker) {
 }
 
 async function searchDrugs(rowId, q) {
-  const data = await api(`/api/search?q=${encodeURIComponent(q)}`);
+  const data = await searchApi(q, `picker-${rowId}`);
+  if (!data || !getPicker(rowId)) return;
   renderSuggestions(rowId, data.results, "Try another spelling or synonym.", "search");
 }
 
@@ -259,8 +434,9 @@ async function openDrugOptions(rowId) {
   suggestions.classList.add("open");
 
   const q = input.value.trim();
-  const endpoint = q.length >= 2 ? `/api/options?q=${encodeURIComponent(q)}` : "/api/options";
-  const data = await api(endpoint);
+  window.clearTimeout(state.searchTimers[rowId]);
+  const data = q.length >= 2 ? await searchApi(q, `picker-${rowId}`) : await api("/api/options", { slot: `picker-${rowId}` });
+  if (!data || !getPicker(rowId)) return;
   renderSuggestions(
     rowId,
     data.results,
@@ -380,7 +556,9 @@ function updateSelectedState(message = "") {
 async function loadDrugDetail(rowId) {
   const row = getRow(rowId);
   if (!row?.drug) return;
-  const data = await api(`/api/drugs/${encodeURIComponent(row.drug.id)}`);
+  const drugId = row.drug.id;
+  const data = await api(`/api/drugs/${encodeURIComponent(drugId)}`);
+  if (row.drug?.id !== drugId) return;
   row.detail = data.error ? null : data;
 }
 
@@ -393,7 +571,8 @@ async function checkInteractions() {
 
   els.resultPanel.innerHTML = `<div class="empty-state"><span class="status-dot"></span><p>Checking ${selected.length} drugs...</p></div>`;
   const ids = selected.map((row) => row.drug.id).join(",");
-  const data = await api(`/api/check-many?ids=${encodeURIComponent(ids)}`);
+  const data = await api(`/api/check-many?ids=${encodeURIComponent(ids)}&selection=${state.selectionToken}`, { slot: "check" });
+  if (!data) return;
   if (data.error) {
     els.resultPanel.innerHTML = `<p class="error">${escapeHtml(data.error)}</p>`;
     return;
@@ -410,11 +589,6 @@ function parseAuditLines(text) {
     .filter((item) => item.length >= 2))].slice(0, 12);
 }
 
-async function matchAuditDrug(name) {
-  const data = await api(`/api/search?q=${encodeURIComponent(name)}`);
-  return data.results?.[0] || null;
-}
-
 function currentAuditLine() {
   const value = els.auditText.value;
   const cursor = els.auditText.selectionStart || 0;
@@ -451,7 +625,8 @@ async function updateAuditSuggestions() {
     return;
   }
 
-  const data = await api(`/api/search?q=${encodeURIComponent(line.text)}`);
+  const data = await searchApi(line.text, "audit-suggestions");
+  if (!data) return;
   const results = (data.results || []).slice(0, 5);
   if (!results.length) {
     closeAuditSuggestions();
@@ -502,47 +677,107 @@ function renderAuditMatches(matches, missing = []) {
   `;
 }
 
-async function runPrescriptionAudit() {
+function runPrescriptionAudit() {
   const names = parseAuditLines(els.auditText.value);
   if (names.length < 2) {
     els.auditStatus.innerHTML = `<p class="error">Paste at least two medicines to audit.</p>`;
     return;
   }
 
+  state.auditStream?.close();
   els.auditStatus.innerHTML = `<p class="muted">Matching ${names.length} medicines against DrugBank...</p>`;
-  const results = await Promise.all(names.map(async (name) => ({ input: name, drug: await matchAuditDrug(name) })));
-  const matches = [];
-  const missing = [];
-  for (const item of results) {
-    if (item.drug && !matches.some((match) => match.drug.id === item.drug.id)) {
-      matches.push(item);
-    } else {
-      missing.push(item.input);
-    }
-  }
-
-  renderAuditMatches(matches, missing);
-  if (matches.length < 2) {
-    els.selectionHint.textContent = "Audit needs at least two matched medicines.";
-    return;
-  }
+  const params = new URLSearchParams();
+  names.forEach((name) => params.append("names", name));
+  params.set("contexts", [...state.patientContexts].join(","));
+  params.set("selection", state.selectionToken);
+  const stream = new EventSource(`/api/audit/stream?${params}`);
+  state.auditStream = stream;
+
+  const stage = (event, handler) => {
+    stream.addEventListener(event, (message) => {
+      if (state.auditStream === stream) handler(JSON.parse(message.data));
+    });
+  };
+  const finish = () => {
+    stream.close();
+    if (state.auditStream === stream) state.auditStream = null;
+  };
 
-  state.rows = [];
-  state.activeBrowseId = null;
-  matches.forEach((match) => addDrugRow(match.drug));
-  while (state.rows.length < 2) addDrugRow();
-  renderDrugRows();
-  for (let index = 0; index < matches.length; index += 1) {
-    await setDrugInRow(state.rows[index].rowId, matches[index].drug);
-  }
-  state.activeBrowseId = matches[0].drug.id;
-  updateSelectedState(`Audit loaded ${matches.length} matched medicines.`);
-  renderDrugRows();
-  renderDetails();
-  renderBrowseTabs();
-  await loadInteractionList();
-  await loadAlternativeSuggestions();
-  await checkInteractions();
+  stage("resolved", (data) => {
+    renderAuditMatches(data.matches, data.missing);
+    if (data.matches.length < 2) {
+      els.selectionHint.textContent = "Audit needs at least two matched medicines.";
+      return;
+    }
+    state.rows = [];
+    state.activeBrowseId = null;
+    data.matches.forEach((match) => addDrugRow(match.drug));
+    while (state.rows.length < 2) addDrugRow();
+    state.activeBrowseId = data.matches[0].drug.id;
+    updateSelectedState(`Audit loaded ${data.matches.length} matched medicines.`);
+    renderDrugRows();
+    renderDetails();
+    renderBrowseTabs();
+    els.resultPanel.innerHTML = `<div class="empty-state"><span class="status-dot"></span><p>Checking ${data.matches.length} drugs...</p></div>`;
+    els.alternativeDrugs.innerHTML = `<p class="muted">Finding related drugs for ${escapeHtml(data.matches[0].drug.name)}...</p>`;
+    loadInteractionList();
+    prefetchProfiles(data.matches.map((match) => match.drug.id))
+      .catch(() => {})
+      .then(() => Promise.all(selectedRows().map((row) => loadDrugDetail(row.rowId))))
+      .then(renderDetails);
+  });
+  stage("pairs", (data) => {
+    if (data.error) {
+      els.resultPanel.innerHTML = `<p class="error">${escapeHtml(data.error)}</p>`;
+      return;
+    }
+    state.lastCheckData = data;
+    renderMultiResults(data);
+    els.aiSummary.innerHTML = `<p class="muted">Analyzing selected DrugBank records...</p>`;
+    els.interactionGraph.innerHTML = `<p class="muted">Building graph...</p>`;
+    els.foodWarnings.innerHTML = `<p class="muted">Checking food interactions...</p>`;
+    els.sharedSignals.innerHTML = `<p class="muted">Scanning mechanisms...</p>`;
+    if (state.patientContexts.size) {
+      els.patientRisk.innerHTML = `<p class="muted">Scoring patient context...</p>`;
+      els.explainableAi.innerHTML = `<p class="muted">Tracing matched DrugBank evidence...</p>`;
+    }
+  });
+  stage("insights", (data) => {
+    if (data.error) {
+      els.aiSummary.innerHTML = `<p class="error">${escapeHtml(data.error)}</p>`;
+      return;
+    }
+    state.lastInsights = data;
+    renderAiSummary(data);
+    renderInteractionGraph(data);
+    renderFoodWarnings(data.foodWarnings);
+    renderSharedSignals(data.shared);
+  });
+  stage("risk", (data) => {
+    if (data.skipped) {
+      state.lastPatientRisk = null;
+      els.patientRisk.innerHTML = `<p class="muted">No patient context selected. Choose one or more chips above to personalize the score.</p>`;
+      els.explainableAi.innerHTML = `<p class="muted">The evidence trace appears when patient context scoring is active.</p>`;
+      return;
+    }
+    if (data.error) {
+      els.patientRisk.innerHTML = `<p class="error">${escapeHtml(data.error)}</p>`;
+      return;
+    }
+    state.lastPatientRisk = data;
+    renderPatientRisk(data);
+    renderExplainableAi(data);
+  });
+  stage("alternatives", renderAlternatives);
+  stage("failed", (data) => {
+    els.selectionHint.textContent = data.error;
+    finish();
+  });
+  stage("done", finish);
+  stream.addEventListener("error", () => {
+    if (state.auditStream === stream) els.selectionHint.textContent = "Audit stream was interrupted.";
+    finish();
+  });
 }
 
 function renderMultiResults(data) {
@@ -620,7 +855,8 @@ async function loadAiInsights(ids) {
   els.sharedSignals.innerHTML = `<p class="muted">Scanning mechanisms...</p>`;
   loadPatientRisk(ids);
 
-  const data = await api(`/api/ai-insights?ids=${encodeURIComponent(ids)}`);
+  const data = await api(`/api/ai-insights?ids=${encodeURIComponent(ids)}&selection=${state.selectionToken}`, { slot: "insights" });
+  if (!data) return;
   if (data.error) {
     els.aiSummary.innerHTML = `<p class="error">${escapeHtml(data.error)}</p>`;
     return;
@@ -643,7 +879,8 @@ async function loadPatientRisk(ids) {
   const contexts = [...state.patientContexts].join(",");
   els.patientRisk.innerHTML = `<p class="muted">Scoring patient context...</p>`;
   els.explainableAi.innerHTML = `<p class="muted">Tracing matched DrugBank evidence...</p>`;
-  const data = await api(`/api/patient-risk?ids=${encodeURIComponent(ids)}&contexts=${encodeURIComponent(contexts)}`);
+  const data = await api(`/api/patient-risk?ids=${encodeURIComponent(ids)}&contexts=${encodeURIComponent(contexts)}&selection=${state.selectionToken}`, { slot: "risk" });
+  if (!data) return;
   if (data.error) {
     els.patientRisk.innerHTML = `<p class="error">${escapeHtml(data.error)}</p>`;
     return;
@@ -748,6 +985,7 @@ function renderAiSummary(data) {
 function renderInteractionGraph(data) {
   const nodes = data.nodes || [];
   const edges = data.edges || [];
+  const inferredEdges = data.inferredEdges || [];
   if (!nodes.length) {
     els.interactionGraph.innerHTML = `<p class="muted">No graph available.</p>`;
     return;
@@ -772,7 +1010,20 @@ function renderInteractionGraph(data) {
       const source = positions[edge.source];
       const target = positions[edge.target];
       const cls = edge.found ? edge.severity : "none";
-      return `<line class="graph-edge ${cls}" x1="${source.x}" y1="${source.y}" x2="${target.x}" y2="${target.y}"><title>${escapeHtml(edge.sourceName)} + ${escapeHtml(edge.targetName)}: ${escapeHtml(edge.label)}</title></line>`;
+      const shared = edge.sharedItems || 0;
+      const weight = shared ? ` style="stroke-width: ${((cls === "high" ? 5 : 3) + Math.min(4, Math.log2(1 + shared))).toFixed(1)}"` : "";
+      const sharedNote = shared ? ` · ${shared} shared categor${shared === 1 ? "y" : "ies"}, targets or enzymes` : "";
+      return `<line class="graph-edge ${cls}"${weight} x1="${source.x}" y1="${source.y}" x2="${target.x}" y2="${target.y}"><title>${escapeHtml(edge.sourceName)} + ${escapeHtml(edge.targetName)}: ${escapeHtml(edge.label)}${sharedNote}</title></line>`;
+    })
+    .join("");
+
+  const inferredMarkup = inferredEdges
+    .map((edge) => {
+      const source = positions[edge.source];
+      const target = positions[edge.target];
+      const bendX = (source.x + target.x) / 2 + (centerX - (source.x + target.x) / 2) * 0.35;
+      const bendY = (source.y + target.y) / 2 + (centerY - (source.y + target.y) / 2) * 0.35;
+      return `<path class="graph-edge inferred ${edge.severity}" d="M ${source.x} ${source.y} Q ${bendX} ${bendY} ${target.x} ${target.y}"><title>${escapeHtml(edge.sourceName)} + ${escapeHtml(edge.targetName)}: ${escapeHtml(edge.label)} · ${escapeHtml(edge.description)}</title></path>`;
     })
     .join("");
 
@@ -794,12 +1045,14 @@ function renderInteractionGraph(data) {
       <span><i class="legend high"></i>High</span>
       <span><i class="legend moderate"></i>Monitor</span>
       <span><i class="legend none"></i>No listed row</span>
+      <span><i class="legend inferred"></i>Inferred pathway</span>
     </div>
   `;
 
   els.interactionGraph.innerHTML = `
     <svg class="interaction-svg" viewBox="0 0 ${width} ${height}" role="img" aria-label="Drug interaction graph">
       ${edgeMarkup}
+      ${inferredMarkup}
       ${nodeMarkup}
     </svg>
     ${legend}
@@ -857,7 +1110,11 @@ async function loadAlternativeSuggestions() {
 
   const source = selected.find((row) => row.drug.id === state.activeBrowseId) || selected[0];
   els.alternativeDrugs.innerHTML = `<p class="muted">Finding related drugs for ${escapeHtml(source.drug.name)}...</p>`;
-  const data = await api(`/api/similar?drug=${encodeURIComponent(source.drug.id)}`);
+  const data = await api(`/api/similar?drug=${encodeURIComponent(source.drug.id)}`, { slot: "similar" });
+  if (data) renderAlternatives(data);
+}
+
+function renderAlternatives(data) {
   if (data.error) {
     els.alternativeDrugs.innerHTML = `<p class="error">${escapeHtml(data.error)}</p>`;
     return;
@@ -970,7 +1227,8 @@ async function loadInteractionList() {
 
   const filter = els.browseFilter.value.trim();
   els.interactionList.innerHTML = `<p class="muted">Loading interactions for ${escapeHtml(selected.drug.name)}...</p>`;
-  const data = await api(`/api/drugs/${encodeURIComponent(selected.drug.id)}/interactions?q=${encodeURIComponent(filter)}`);
+  const data = await api(`/api/drugs/${encodeURIComponent(selected.drug.id)}/interactions?q=${encodeURIComponent(filter)}`, { slot: "interactions" });
+  if (!data) return;
   if (!data.results.length) {
     els.interactionList.innerHTML = `<p class="muted">No matching interactions found.</p>`;
     return;
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from itertools import accumulate
+from pathlib import Path
+from typing import Iterator
+
+from app import PATIENT_CONTEXT_RULES
+
+
+# Share of drugs that carry interactions and rich structured fields.
+RICH_SHARE = 0.68
+
+# Approximate row counts of a full DrugBank 5.1 export at --scale 1.0.
+FULL_COUNTS = {
+    "drugs": 16_500,
+    "interaction_pairs": 1_400_000,
+    "synonyms_per_drug": 3.5,
+    "food_rows": 3_100,
+    "categories_per_drug": 6.0,
+    "distinct_categories": 4_300,
+    "targets_per_drug": 1.2,
+    "distinct_targets": 4_800,
+    "enzymes_per_drug": 0.35,
+    "distinct_enzymes": 420,
+    "carriers_per_drug": 0.06,
+    "transporters_per_drug": 0.2,
+    "distinct_transporters": 260,
+    "products_per_drug": 24.0,
+    "dosages_per_drug": 1.8,
+}
+
+SCHEMA = """
+CREATE TABLE drugs (
+    drugbank_id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    indication TEXT,
+    pharmacodynamics TEXT,
+    mechanism_of_action TEXT,
+    toxicity TEXT,
+    metabolism TEXT,
+    absorption TEXT,
+    half_life TEXT,
+    route_of_elimination TEXT
+);
+CREATE TABLE synonyms (drug_id TEXT, synonym TEXT);
+CREATE TABLE drug_interactions (drug1_id TEXT, drug2_id TEXT, description TEXT);
+CREATE TABLE food_interactions (drug_id TEXT, description TEXT);
+CREATE TABLE categories (drug_id TEXT, category TEXT, mesh_id TEXT);
+CREATE TABLE targets (drug_id TEXT, name TEXT, organism TEXT, action TEXT);
+CREATE TABLE enzymes (drug_id TEXT, name TEXT, organism TEXT, action TEXT);
+CREATE TABLE carriers (drug_id TEXT, name TEXT, organism TEXT, action TEXT);
+CREATE TABLE transporters (drug_id TEXT, name TEXT, organism TEXT, action TEXT);
+CREATE TABLE products (drug_id TEXT, name TEXT, manufacturer TEXT, dosage_form TEXT, route TEXT);
+CREATE TABLE dosages (drug_id TEXT, form TEXT, route TEXT, strength TEXT);
+"""
+
+REAL_NAMES = (
+    "Acetylsalicylic acid", "Warfarin", "Apixaban", "Metformin", "Atorvastatin", "Ibuprofen",
+    "Acetaminophen", "Amoxicillin", "Omeprazole", "Clopidogrel", "Simvastatin", "Lisinopril",
+    "Amlodipine", "Prednisone", "Fluoxetine", "Sertraline", "Ciprofloxacin", "Levothyroxine",
+    "Digoxin", "Rivaroxaban", "Heparin", "Naproxen", "Tramadol", "Diazepam", "Lithium",
+)
+
+SYLLABLES = ("ab", "ac", "al", "am", "an", "ar", "bel", "ca", "cor", "da", "del", "do", "en", "er", "fa", "fe",
+             "ga", "li", "lo", "ma", "me", "mo", "na", "ni", "no", "pa", "pe", "pi", "ra", "re", "ri", "sa",
+             "se", "ta", "te", "ti", "to", "va", "ve", "vi", "xa", "ze", "zo")
+SUFFIXES = ("pril", "olol", "statin", "sartan", "mab", "vir", "azole", "cillin", "floxacin", "tinib",
+            "dipine", "prazole", "parin", "xaban", "oxetine", "azepam", "cycline", "mycin", "lukast", "gliptin",
+            "ine", "ide", "ate", "one", "il")
+WORDS = ("the", "of", "and", "in", "to", "a", "with", "is", "by", "for", "as", "was", "patients", "dose",
+         "drug", "plasma", "receptor", "clinical", "studies", "effect", "activity", "administration",
+         "concentration", "oral", "therapy", "treatment", "levels", "mg", "response", "inhibition",
+         "binding", "protein", "affinity", "selective", "pathway", "signal", "absorbed", "exposure",
+         "trial", "healthy", "volunteers", "approximately", "observed", "reported", "following",
+         "single", "daily", "mean", "peak", "tissue", "cells", "acute", "chronic", "symptoms")
+ESCALATORS = ("contraindicated", "fatal", "life-threatening", "toxicity", "severe", "increased risk")
+CONTEXT_TERMS = tuple(term for rule in PATIENT_CONTEXT_RULES.values() for term in rule["terms"])
+
+INTERACTION_TEMPLATES = (
+    (30, "The risk or severity of adverse effects can be increased when {a} is combined with {b}."),
+    (14, "The serum concentration of {b} can be increased when it is combined with {a}."),
+    (10, "The metabolism of {b} can be decreased when combined with {a}."),
+    (9, "{a} may decrease the excretion rate of {b} which could result in a higher serum level."),
+    (8, "The therapeutic efficacy of {b} can be decreased when used in combination with {a}."),
+    (6, "The risk or severity of bleeding and hemorrhage can be increased when {a} is combined with {b}."),
+    (5, "{a} may increase the hypotensive activities of {b}."),
+    (5, "{a} may increase the central nervous system depressant (CNS depressant) activities of {b}."),
+    (4, "The risk or severity of QTc prolongation can be increased when {a} is combined with {b}."),
+    (3, "{a} may increase the nephrotoxic activities of {b}."),
+    (3, "The risk or severity of hypoglycemia can be increased when {a} is combined with {b}."),
+    (2, "The use of {a} together with {b} is contraindicated due to an increased risk of fatal toxicity."),
+    (1, "{a} can cause a decrease in the absorption of {b} resulting in a reduced serum concentration."),
+)
+FOOD_TEMPLATES = (
+    "Avoid alcohol. Ingesting alcohol may increase CNS depression and drowsiness.",
+    "Take with food. Food reduces gastrointestinal irritation.",
+    "Avoid grapefruit products. Grapefruit inhibits CYP3A4 metabolism and increases serum levels.",
+    "Avoid herbs and supplements with anticoagulant or antiplatelet activity, such as garlic, ginger and ginkgo.",
+    "Take on an empty stomach. Food delays absorption.",
+    "Limit caffeine intake.",
+    "Avoid St. John's Wort. This herb induces hepatic metabolism and may reduce serum levels.",
+    "Maintain consistent vitamin K intake to keep INR stable.",
+)
+ENZYME_NAMES = ("Cytochrome P450 3A4", "Cytochrome P450 2D6", "Cytochrome P450 2C9", "Cytochrome P450 2C19",
+                "Cytochrome P450 1A2", "Cytochrome P450 2B6", "Cytochrome P450 2E1", "Cytochrome P450 3A5",
+                "UDP-glucuronosyltransferase 1-1", "Carboxylesterase 1")
+TRANSPORTER_NAMES = ("Multidrug resistance protein 1", "Solute carrier family 22 member 6",
+                     "Solute carrier organic anion transporter family member 1B1", "ATP-binding cassette sub-family G member 2",
+                     "Solute carrier family 22 member 2", "Multidrug and toxin extrusion protein 1")
+ENZYME_ACTIONS = (("substrate", 60), ("inhibitor", 25), ("inducer", 6), ("", 9))
+TARGET_ACTIONS = (("inhibitor", 30), ("agonist", 15), ("antagonist", 20), ("binder", 10), ("", 25))
+FORMS = ("Tablet", "Capsule", "Injection, solution", "Tablet, film coated", "Solution", "Cream", "Suspension")
+ROUTES = ("Oral", "Intravenous", "Topical", "Subcutaneous", "Intramuscular", "Ophthalmic")
+
+
+class TextGenerator:
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+
+    def sentence(self, context_rate: float) -> str:
+        rng = self.rng
+        words = [rng.choice(WORDS) for _ in range(rng.randint(10, 28))]
+        if rng.random() < context_rate:
+            words.insert(rng.randrange(len(words)), rng.choice(CONTEXT_TERMS))
+        if rng.random() < context_rate / 3:
+            words.insert(rng.randrange(len(words)), rng.choice(ESCALATORS))
+        text = " ".join(words).capitalize()
+        roll = rng.random()
+        if roll < 0.08:
+            text += f" [A{rng.randint(1000, 250000)}]"
+        elif roll < 0.12:
+            text += f" [L{rng.randint(100, 9000)}, FDA label]"
+        elif roll < 0.14:
+            text = text.replace(" plasma ", " C<sub>max</sub> plasma ", 1)
+        elif roll < 0.16:
+            text = f"**{text}**"
+        return text + "."
+
+    def paragraph(self, min_sentences: int, max_sentences: int, context_rate: float, empty_rate: float) -> str | None:
+        if self.rng.random() < empty_rate:
+            return None
+        count = self.rng.randint(min_sentences, max_sentences)
+        return " ".join(self.sentence(context_rate) for _ in range(count))
+
+
+def pareto_counts(rng: random.Random, total: int, weights: list[float]) -> list[int]:
+    scale = total / max(sum(weights), 1e-9)
+    counts = []
+    for weight in weights:
+        expected = weight * scale
+        count = int(expected)
+        counts.append(count + (rng.random() < expected - count))
+    return counts
+
+
+def sample_count(rng: random.Random, mean: float) -> int:
+    value = rng.expovariate(1 / mean) if mean > 0 else 0.0
+    return int(value) + (rng.random() < value - int(value))
+
+
+def skewed_choice(rng: random.Random, size: int, power: float = 3.0) -> int:
+    return int(size * rng.random() ** power)
+
+
+def drug_names(rng: random.Random, count: int) -> list[str]:
+    names = list(REAL_NAMES[:count])
+    seen = {name.lower() for name in names}
+    while len(names) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))) + rng.choice(SUFFIXES)
+        name = name.capitalize()
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def interaction_pairs(rng: random.Random, weights: list[float], target: int) -> set[int]:
+    count = len(weights)
+    possible = sum(1 for weight in weights if weight > 0)
+    target = min(target, int(possible * (possible - 1) / 2 * 0.6))
+    cumulative = list(accumulate(weights))
+    population = range(count)
+    pairs: set[int] = set()
+    attempts = 0
+    while len(pairs) < target and attempts < target * 20:
+        batch = min(200_000, (target - len(pairs)) * 2)
+        left = rng.choices(population, cum_weights=cumulative, k=batch)
+        right = rng.choices(population, cum_weights=cumulative, k=batch)
+        for first, second in zip(left, right):
+            if first != second:
+                low, high = (first, second) if first < second else (second, first)
+                pairs.add(low * count + high)
+        attempts += batch
+    return set(list(pairs)[:target]) if len(pairs) > target else pairs
+
+
+def batched(rows: Iterator[tuple], size: int = 20_000) -> Iterator[list[tuple]]:
+    batch: list[tuple] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(path: Path, scale: float, seed: int) -> dict[str, int]:
+    rng = random.Random(seed)
+    text = TextGenerator(rng)
+    drug_count = max(40, int(FULL_COUNTS["drugs"] * scale))
+    ids = [f"DB{index + 1:05d}" for index in range(drug_count)]
+    names = drug_names(rng, drug_count)
+    # Roughly a third of DrugBank entries (biologics, experimental compounds) have no interactions.
+    weights = [0.0 if index >= len(REAL_NAMES) and rng.random() > RICH_SHARE else min(rng.paretovariate(1.3), 60.0) for index in range(drug_count)]
+    for index in range(min(len(REAL_NAMES), drug_count)):
+        weights[index] = max(weights[index], 20.0)
+    rich = [weight > 0 for weight in weights]
+
+    if path.exists():
+        path.unlink()
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    counts: dict[str, int] = {}
+
+    def insert(table: str, rows: Iterator[tuple]) -> None:
+        total = 0
+        for batch in batched(rows):
+            placeholders = ",".join("?" for _ in batch[0])
+            db.executemany(f"INSERT INTO {table} VALUES ({placeholders})", batch)
+            total += len(batch)
+        counts[table] = total
+
+    def drug_rows() -> Iterator[tuple]:
+        for index, drug_id in enumerate(ids):
+            empty = 0.08 if rich[index] else 0.55
+            yield (
+                drug_id,
+                names[index],
+                text.paragraph(2, 8, 0.25, 0.02),
+                text.paragraph(1, 5, 0.3, empty),
+                text.paragraph(2, 7, 0.3, empty),
+                text.paragraph(2, 8, 0.3, empty),
+                text.paragraph(2, 9, 0.45, empty),
+                text.paragraph(1, 5, 0.5, empty),
+                text.paragraph(1, 4, 0.25, empty),
+                text.paragraph(1, 2, 0.1, empty),
+                text.paragraph(1, 3, 0.5, empty),
+            )
+
+    def synonym_rows() -> Iterator[tuple]:
+        for index, drug_id in enumerate(ids):
+            for _ in range(sample_count(rng, FULL_COUNTS["synonyms_per_drug"])):
+                if rng.random() < 0.6:
+                    yield drug_id, f"{names[index]} {rng.choice(('sodium', 'hydrochloride', 'calcium', 'potassium', 'mesylate'))}"
+                else:
+                    yield drug_id, "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+
+    def interaction_rows() -> Iterator[tuple]:
+        templates = [template for _, template in INTERACTION_TEMPLATES]
+        template_weights = [weight for weight, _ in INTERACTION_TEMPLATES]
+        for key in interaction_pairs(rng, weights, int(FULL_COUNTS["interaction_pairs"] * scale)):
+            first, second = divmod(key, drug_count)
+            template = rng.choices(templates, template_weights)[0]
+            yield ids[first], ids[second], template.format(a=names[first], b=names[second])
+            yield ids[second], ids[first], template.format(a=names[second], b=names[first])
+
+    def food_rows() -> Iterator[tuple]:
+        per_drug = pareto_counts(rng, int(FULL_COUNTS["food_rows"] * scale), [weight ** 0.5 for weight in weights])
+        for index, count in enumerate(per_drug):
+            for template in rng.sample(FOOD_TEMPLATES, min(count, len(FOOD_TEMPLATES))):
+                yield ids[index], template
+
+    def linked_rows(per_drug: float, distinct: int, label: str, action_weights: tuple[tuple[str, int], ...] | None, named: tuple[str, ...] = ()) -> Iterator[tuple]:
+        distinct = max(8, int(distinct * max(scale, 0.05)))
+        actions = [action for action, _ in action_weights or (("", 1),)]
+        action_odds = [odds for _, odds in action_weights or (("", 1),)]
+        for index, drug_id in enumerate(ids):
+            count = sample_count(rng, per_drug / RICH_SHARE) if rich[index] else sample_count(rng, per_drug / 4)
+            chosen = {skewed_choice(rng, distinct) for _ in range(count)}
+            for item in chosen:
+                name = named[item] if item < len(named) else f"{label} {item + 1}"
+                yield drug_id, name, "Humans", rng.choices(actions, action_odds)[0]
+
+    def category_rows() -> Iterator[tuple]:
+        distinct = max(12, int(FULL_COUNTS["distinct_categories"] * max(scale, 0.05)))
+        for index, drug_id in enumerate(ids):
+            count = max(1, sample_count(rng, FULL_COUNTS["categories_per_drug"] / RICH_SHARE)) if rich[index] else rng.randint(0, 2)
+            for item in {skewed_choice(rng, distinct, 2.0) for _ in range(count)}:
+                yield drug_id, f"Category {item + 1}", f"D{item:06d}"
+
+    def product_rows() -> Iterator[tuple]:
+        for index, drug_id in enumerate(ids):
+            count = int(rng.lognormvariate(2.3, 1.5)) if rich[index] else 0
+            for _ in range(min(count, 2000)):
+                yield drug_id, f"{names[index]} {rng.choice((5, 10, 20, 25, 50, 100, 250, 500))} mg", f"Manufacturer {rng.randint(1, 900)}", rng.choice(FORMS), rng.choice(ROUTES)
+
+    def dosage_rows() -> Iterator[tuple]:
+        for index, drug_id in enumerate(ids):
+            for _ in range(sample_count(rng, FULL_COUNTS["dosages_per_drug"])):
+                yield drug_id, rng.choice(FORMS), rng.choice(ROUTES), f"{rng.choice((1, 2.5, 5, 10, 20, 40, 100))} mg"
+
+    insert("drugs", drug_rows())
+    insert("synonyms", synonym_rows())
+    insert("drug_interactions", interaction_rows())
+    insert("food_interactions", food_rows())
+    insert("categories", category_rows())
+    insert("targets", linked_rows(FULL_COUNTS["targets_per_drug"], FULL_COUNTS["distinct_targets"], "Target protein", TARGET_ACTIONS))
+    insert("enzymes", linked_rows(FULL_COUNTS["enzymes_per_drug"], FULL_COUNTS["distinct_enzymes"], "Enzyme", ENZYME_ACTIONS, ENZYME_NAMES))
+    insert("carriers", linked_rows(FULL_COUNTS["carriers_per_drug"], 30, "Carrier", (("binder", 1),), ("Serum albumin", "Alpha-1-acid glycoprotein 1")))
+    insert("transporters", linked_rows(FULL_COUNTS["transporters_per_drug"], FULL_COUNTS["distinct_transporters"], "Transporter", ENZYME_ACTIONS, TRANSPORTER_NAMES))
+    insert("products", product_rows())
+    insert("dosages", dosage_rows())
+    db.commit()
+    db.close()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a synthetic SQLite database with the DrugBank schema NeuroPharmDB queries.")
+    parser.add_argument("output", help="Database file to create (overwritten)")
+    parser.add_argument("--scale", type=float, default=0.1, help="1.0 approximates a full DrugBank export")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(Path(args.output), args.scale, args.seed)
+    for table, count in counts.items():
+        print(f"{table:>18} {count:>10,}", file=sys.stderr)
+    print(f"Built {args.output} at scale {args.scale} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()